@@ -0,0 +1,117 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+from utils import (draw_contour_mask, find_blobs, find_contours,
+                   get_centroid)
+
+
+def _timer(rng):
+    # Seven segment bars of a four digit timer.
+    mask = np.zeros((120, 230), np.uint8)
+    for digit in range(4):
+        x = 10 + digit * 55
+        for bx, by, w, h in ((5, 5, 30, 8), (5, 50, 30, 8), (5, 100, 30, 8),
+                             (0, 10, 8, 40), (35, 10, 8, 40), (0, 60, 8, 40),
+                             (35, 60, 8, 40)):
+            if rng.random() < 0.7:
+                cv2.rectangle(mask, (x+bx, by), (x+bx+w, by+h), 255, -1)
+    return mask
+
+def _glyphs(count, size):
+    # Text on a plain background, as serial, indicator and memory crops.
+    def draw(rng):
+        mask = np.zeros((size[1], size[0]), np.uint8)
+        for i in range(count):
+            cv2.putText(
+                mask, chr(rng.integers(65, 91)), (10 + i * 50, size[1] - 15),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.6, 255, 4)
+        return mask
+    return draw
+
+def _keypad(rng):
+    mask = np.zeros((300, 300), np.uint8)
+    for x, y in ((40, 40), (160, 40), (40, 160), (160, 160)):
+        cv2.rectangle(mask, (x, y), (x+90, y+90), 255, -1)
+        cv2.circle(mask, (x+45, y+45), int(rng.integers(10, 25)), 0, 5)
+    return mask
+
+def _wires(rng):
+    mask = np.zeros((293, 297), np.uint8)
+    for i in range(int(rng.integers(3, 7))):
+        y = 30 + i * 40
+        cv2.line(mask, (20, y), (270, y + int(rng.integers(-10, 10))), 255, 10)
+    return mask
+
+def _maze(rng):
+    mask = np.zeros((260, 260), np.uint8)
+    for i in range(6):
+        for j in range(6):
+            x, y = 20 + i * 40, 20 + j * 40
+            cv2.rectangle(mask, (x, y), (x+9, y+9), 255, -1)
+    return mask
+
+# Masks shaped like the ones each detector segments.
+_WORKLOADS = {
+    'detect_timer': _timer,
+    'detect_memory': _glyphs(5, (280, 80)),
+    'detect_keypad': _keypad,
+    'detect_serial': _glyphs(6, (320, 80)),
+    'detect_indicators': _glyphs(3, (170, 80)),
+    'detect_wires': _wires,
+    'detect_maze': _maze,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"detector":18} {"blobs":>5} {"contours":>9} {"blobs":>9} '
+          f'{"speedup":>7}')
+    for name, draw in _WORKLOADS.items():
+        mask = draw(rng)
+        count = len(_contour_stats(mask))
+        contour_ms = _time(lambda: _contour_stats(mask), args.repeat)
+        blob_ms = _time(lambda: _blob_stats(mask), args.repeat)
+        print(f'{name:18} {count:5} {contour_ms:7.3f}ms {blob_ms:7.3f}ms '
+              f'{contour_ms / blob_ms:6.2f}x')
+
+def _contour_stats(mask):
+    # The per contour loop the detectors used: area filter, sort by left
+    # edge, bounding box, centroid and masked crop.
+    contours = [c for c in find_contours(mask) if cv2.contourArea(c) >= 50]
+    contours.sort(key=lambda c: c[:, :, 0].min())
+    result = []
+    for contour in contours:
+        bbox = cv2.boundingRect(contour)
+        crop = mask[bbox[1]:bbox[1]+bbox[3], bbox[0]:bbox[0]+bbox[2]]
+        crop = crop & draw_contour_mask(
+            np.zeros_like(crop), contour, offset=(-bbox[0], -bbox[1]))
+        result.append((bbox, get_centroid(contour), crop))
+    return result
+
+def _blob_stats(mask):
+    blobs = find_blobs(mask)
+    blobs = blobs[blobs.area >= 50]
+    blobs = blobs[np.argsort(blobs.x, kind='stable')]
+    return [(blobs.bbox(i), blobs.centroids[i], blobs.filled_image(i))
+            for i in range(len(blobs))]
+
+def _time(function, repeat: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+if __name__ == '__main__':
+    main()
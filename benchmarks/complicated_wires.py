@@ -0,0 +1,135 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+import detectors.complicated_wires as detector
+from frame import Frame
+
+# HSV colors inside the detector's ranges.
+_STAR_BACKGROUND = (20, 170, 150)
+_STAR = (20, 60, 40)
+_LIT_LED = (15, 90, 245)
+_UNLIT_LED = (30, 95, 20)
+# Wire x positions of the zoomed module, its size and the size of the
+# first bomb face slot the detector sees it at.
+_SLOT_XS = (41, 77, 119, 163, 197, 236)
+_ZOOMED_SIZE = (297, 293)
+_SLOT_SIZE = (262, 243)
+_WIRES = {
+    'r': ((5, 230, 200),),
+    'b': ((112, 200, 180),),
+    'w': ((15, 30, 220),),
+    'bw': ((112, 200, 180), (15, 30, 220)),
+    'rw': ((172, 220, 200), (15, 30, 220)),
+    'br': ((112, 200, 180), (172, 220, 200)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', metavar='DIR',
+                        help='bomb face slot crops (*.png) of the module to '
+                             'use instead of synthetic ones')
+    parser.add_argument('--size', type=int, nargs=2, default=_SLOT_SIZE,
+                        help='size to scale the synthetic modules to')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.images:
+        images = [cv2.imread(str(x))
+                  for x in sorted(Path(args.images).glob('*.png'))]
+        truths = None
+    else:
+        rng = np.random.default_rng(0)
+        images, truths = [], []
+        for _ in range(args.count):
+            image, truth = _render(rng)
+            images.append(
+                cv2.resize(image, args.size, interpolation=cv2.INTER_AREA))
+            truths.append(truth)
+
+    # The first frame the contour path and the sampled detector agree on
+    # sets the sample positions, as at runtime. Crops of one slot share
+    # their shape.
+    contour_results, samples = [], None
+    for image in images:
+        result, points = detector._detect_contours(Frame(image))
+        contour_results.append([list(x) for x in result])
+        if samples is None and points is not None and \
+                detector._detect_sampled(Frame(image), points) \
+                    == contour_results[-1]:
+            samples = points
+    if samples is None:
+        print('no frame to learn the sample positions from')
+        return
+
+    sampled_results = [detector._detect_sampled(Frame(x), samples)
+                       for x in images]
+    decided = [i for i, x in enumerate(sampled_results) if x is not None]
+    agree = sum(sampled_results[i] == contour_results[i] for i in decided)
+
+    contour_ms = _time(
+        lambda: [detector._detect_contours(Frame(x)) for x in images],
+        args.repeat) / len(images)
+    sampled_ms = _time(
+        lambda: [detector._detect_sampled(Frame(x), samples) for x in images],
+        args.repeat) / len(images)
+    fallback = 1 - len(decided) / len(images)
+    print(f'frames    {len(images)}')
+    print(f'contours  {contour_ms:7.3f} ms/frame')
+    print(f'sampled   {sampled_ms:7.3f} ms/frame')
+    print(f'fallback  {fallback:7.1%} of frames, '
+          f'{sampled_ms + fallback * contour_ms:7.3f} ms/frame with it')
+    print(f'agreement {agree}/{len(decided)} sampled frames')
+    if truths is not None:
+        # Frames that fell back count as wrong for the sampled detector.
+        print(f'correct   contours {_correct(contour_results, truths)}, '
+              f'sampled {_correct(sampled_results, truths)} '
+              f'of {len(images)} frames')
+
+def _render(rng) -> tuple[np.ndarray, list]:
+    # A dark zoomed module with six LEDs, wires below them and star boxes
+    # below the wires, and the wires it shows.
+    width, height = _ZOOMED_SIZE
+    image = np.full((height, width, 3), (100, 40, 35), np.uint8)
+    wires = []
+    for x in _SLOT_XS:
+        is_lit = rng.random() < 0.5
+        cv2.circle(image, (x, 40), 6, _LIT_LED if is_lit else _UNLIT_LED, -1)
+        cv2.rectangle(image, (x-13, 240), (x+13, 272), _STAR_BACKGROUND, -1)
+        has_star = rng.random() < 0.5
+        if has_star:
+            angles = np.arange(10) * np.pi / 5 - np.pi / 2
+            radii = np.where(np.arange(10) % 2, 4, 10)
+            star = np.stack([x + radii * np.cos(angles),
+                             256 + radii * np.sin(angles)], 1)
+            cv2.fillPoly(image, [np.round(star).astype(np.int32)], _STAR)
+        name = ''
+        if rng.random() < 0.8:
+            name = str(rng.choice(list(_WIRES)))
+            colors = _WIRES[name]
+            for i, top in enumerate(range(60, 232, 10)):
+                cv2.rectangle(image, (x-4, top), (x+4, top+9),
+                              colors[i % len(colors)], -1)
+        wires.append([is_lit, has_star, name])
+    return cv2.cvtColor(image, cv2.COLOR_HSV2BGR), wires
+
+def _correct(results, truths) -> int:
+    return sum(x == y for x, y in zip(results, truths))
+
+def _time(function, repeat: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+if __name__ == '__main__':
+    main()
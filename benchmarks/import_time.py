@@ -0,0 +1,50 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+_SOURCE = Path(__file__).resolve().parents[1] / 'source'
+
+# Runs in a fresh interpreter, third party packages are imported first so
+# only the bot's own import work is measured.
+_PROBE = '''
+import sys, time
+import cv2, numpy, torch
+loads = []
+_load = torch.load
+torch.load = lambda *args, **kwargs: loads.append(args[0]) or _load(*args, **kwargs)
+start = time.perf_counter()
+import solvers, detectors.bomb_modules, detectors.indicator, detectors.serial
+imported = time.perf_counter() - start
+print(imported, len(loads))
+if {prefetch}:
+    start = time.perf_counter()
+    solvers.prefetch_solvers()
+    print(time.perf_counter() - start, len(loads))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=250)
+    parser.add_argument('--prefetch', action='store_true',
+                        help='also time loading every solver and model')
+    args = parser.parse_args()
+
+    output = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(prefetch=args.prefetch)],
+        cwd=_SOURCE.parent, env={**os.environ, 'PYTHONPATH': str(_SOURCE)},
+        capture_output=True, text=True, check=True).stdout.split()
+    imported_ms, loads = float(output[0]) * 1e3, int(output[1])
+    print(f'import    {imported_ms:7.1f} ms, {loads} models loaded')
+    if args.prefetch:
+        print(f'prefetch  {float(output[2]) * 1e3:7.1f} ms, '
+              f'{int(output[3])} models loaded')
+
+    if loads or imported_ms > args.budget_ms:
+        print(f'over budget of {args.budget_ms:.0f} ms with no models loaded')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
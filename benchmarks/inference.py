@@ -0,0 +1,92 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+import detectors.indicator
+import detectors.serial
+from inference import CONFIG, set_num_threads
+from precision import PRECISIONS
+from solvers import prefetch_solvers
+
+# Batch sizes and input shapes the detectors and solvers actually use.
+_WORKLOADS = {
+    'BombModules': (6, (262, 272, 3)),
+    'Button': (1, (243, 262, 3)),
+    'WireSequences': (1, (293, 297, 3)),
+    'SerialSymbols': (6, (48, 36)),
+    'IndicatorSymbols': (3, (40, 30)),
+    'KeypadSymbols': (4, (60, 60)),
+    'PasswordSymbols': (5, (40, 30)),
+    'MemorySymbols': (5, (50, 35)),
+    'WhosOnFirstText': (7, (40, 120)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--precision', choices=PRECISIONS, default='fp32')
+    parser.add_argument('--crops', default='crops')
+    args = parser.parse_args()
+
+    if args.threads:
+        set_num_threads(args.threads)
+    CONFIG.set_precision(args.precision, args.crops)
+    prefetch_solvers()
+    engines = {x.name: x for x in CONFIG.engines}
+    rng = np.random.default_rng(0)
+    inputs = {
+        name: [rng.integers(0, 256, shape, dtype=np.uint8)
+               for _ in range(count)]
+        for name, (count, shape) in _WORKLOADS.items()}
+
+    results = {}
+    for compiled in (False, True):
+        CONFIG.set_compiled(compiled)
+        for name, images in inputs.items():
+            engine = engines[name]
+            logits = engine.logits(images)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                engine.logits(images)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1e3
+            results.setdefault(name, []).append(
+                (elapsed, engine.is_compiled, _flatten(logits)))
+
+    if args.precision != 'fp32':
+        for name in inputs:
+            engine = engines[name]
+            agreement = '-' if engine.agreement is None \
+                else f'{engine.agreement:.1%}'
+            print(f'{name:18} {engine.precision:>12} {agreement:>7}')
+        print()
+
+    print(f'{"model":18} {"batch":>5} {"eager":>9} {"compiled":>9} '
+          f'{"speedup":>7} {"max diff":>9}')
+    for name, ((eager_ms, _, eager), (compiled_ms, ok, compiled)) \
+            in results.items():
+        if not ok:
+            # Compiling was measured slower or failed, the engine kept eager.
+            speedup = engines[name].speedup or float('nan')
+            print(f'{name:18} {len(inputs[name]):5} {eager_ms:7.2f}ms '
+                  f'{"eager":>9} {speedup:6.2f}x')
+            continue
+        diff = (eager - compiled).abs().max().item()
+        print(f'{name:18} {len(inputs[name]):5} {eager_ms:7.2f}ms '
+              f'{compiled_ms:7.2f}ms {eager_ms / compiled_ms:6.2f}x '
+              f'{diff:9.2e}')
+
+def _flatten(logits) -> torch.Tensor:
+    if isinstance(logits, torch.Tensor):
+        return logits.clone()
+    return torch.cat([x.flatten() for x in logits])
+
+if __name__ == '__main__':
+    main()
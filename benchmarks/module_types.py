@@ -0,0 +1,80 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+from detectors.bomb_modules import _ENGINE, detect_module_types
+from inference import CONFIG, set_num_threads
+from utils import crop_image
+
+# game_state._BOMB_MODULE_BBOXES, game_state itself needs a mouse backend.
+_BOMB_MODULE_BBOXES = (
+    (560, 291, 262, 243),
+    (849, 291, 251, 243),
+    (1127, 291, 255, 243),
+    (545, 558, 272, 262),
+    (843, 558, 262, 262),
+    (1133, 558, 266, 262))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', help='1920x1080 screenshot of a bomb face')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--prototypes', metavar='DIR',
+                        help='also time the prototype cascade from DIR')
+    args = parser.parse_args()
+
+    if args.threads:
+        set_num_threads(args.threads)
+    if args.image:
+        screen = cv2.imread(args.image)
+    else:
+        screen = np.random.default_rng(0).integers(
+            0, 256, (68, 120, 3), dtype=np.uint8)
+        screen = cv2.resize(screen, (1920, 1080), interpolation=cv2.INTER_CUBIC)
+    crops = [crop_image(screen, x) for x in _BOMB_MODULE_BBOXES]
+
+    single = detect_module_types(crops, batched=False)
+    batched = detect_module_types(crops, batched=True)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        detect_module_types(crops, batched=False)
+    single_ms = (time.perf_counter() - start) / args.repeat * 1e3
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        detect_module_types(crops, batched=True)
+    batched_ms = (time.perf_counter() - start) / args.repeat * 1e3
+
+    if args.prototypes:
+        CONFIG.set_prototypes(args.prototypes)
+        cascaded = detect_module_types(crops)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            detect_module_types(crops)
+        cascade_ms = (time.perf_counter() - start) / args.repeat * 1e3
+        matcher = _ENGINE.matcher
+        hits = 0 if matcher is None else matcher.hits / (args.repeat + 1)
+
+    agree = sum(x == y for x, y in zip(single, batched))
+    print(f'threads   {torch.get_num_threads()}')
+    print(f'per slot  {single_ms:7.2f} ms/face')
+    print(f'batched   {batched_ms:7.2f} ms/face')
+    if args.prototypes:
+        print(f'cascade   {cascade_ms:7.2f} ms/face, '
+              f'{hits:.0f}/{len(crops)} slots matched')
+    print(f'agreement {agree}/{len(crops)}')
+    for i, (x, y) in enumerate(zip(single, batched)):
+        z = cascaded[i].name if args.prototypes else ''
+        print(f'    {x.name:20} {y.name:20} {z}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+import detectors.simon_says
+import detectors.timer
+import solvers.button
+import solvers.morse_code
+import solvers.simon_says
+from detectors.timer import TimerReader
+
+_ARENAS = (
+    detectors.timer._SCRATCH,
+    detectors.simon_says._SCRATCH,
+    solvers.button._SCRATCH,
+    solvers.button._SEGMENTER._scratch,
+    solvers.morse_code._SCRATCH,
+    solvers.simon_says._SCRATCH,
+)
+
+
+class _State:
+    # Serves one captured image per region, as GameState does while a
+    # solver polls.
+    def __init__(self, rng) -> None:
+        self._rng = rng
+
+    def grab_regions(self, bboxes):
+        return [self._image(bbox[3], bbox[2]) for bbox in bboxes]
+
+    def grab_module_regions(self, bboxes):
+        return self.grab_regions(bboxes)
+
+    def _image(self, h, w):
+        if (h, w) == (122, 228):
+            return _timer_image()
+        return self._rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+def _timer_image():
+    # Lit seven segment bars and a colon on a dark background.
+    image = np.zeros((122, 228, 3), np.uint8)
+    for x in (5, 55, 125, 175):
+        for bx, by, w, h in ((5, 5, 30, 8), (5, 55, 30, 8), (5, 105, 30, 8),
+                             (0, 12, 8, 40), (35, 12, 8, 40), (0, 62, 8, 40),
+                             (35, 62, 8, 40)):
+            cv2.rectangle(image, (x+bx, by), (x+bx+w, by+h), (0, 0, 220), -1)
+    for y in (35, 80):
+        cv2.rectangle(image, (106, y), (116, y+12), (0, 0, 220), -1)
+    return image
+
+_TIMER = TimerReader((535, 518, 228, 122))
+
+# The body of each polling loop.
+_POLLS = {
+    'Button strip': lambda state: solvers.button.Button._detect_strip(state),
+    'Button timer': lambda state: solvers.button.Button._read_timer(
+        state, _TIMER),
+    'MorseCode blinker':
+        lambda state: solvers.morse_code.MorseCode._is_blinker_on(state),
+    'SimonSays patches':
+        lambda state: solvers.simon_says.SimonSays._detect(state),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    state = _State(np.random.default_rng(0))
+    print(f'{"poll":18} {"fresh":>9} {"arena":>9} {"fresh":>9} {"arena":>9} '
+          f'{"fresh":>7} {"arena":>7}')
+    for name, poll in _POLLS.items():
+        fresh_ms, fresh_bytes, fresh_blocks = _measure(
+            poll, state, args.repeat, True)
+        arena_ms, arena_bytes, arena_blocks = _measure(
+            poll, state, args.repeat, False)
+        print(f'{name:18} {fresh_ms:7.3f}ms {arena_ms:7.3f}ms '
+              f'{fresh_bytes:8.0f}B {arena_bytes:8.0f}B '
+              f'{fresh_blocks:7.1f} {arena_blocks:7.1f}')
+
+def _measure(
+        poll, state, repeat: int, fresh: bool) -> tuple[float, float, float]:
+    # Fresh empties the arenas before every poll, so each buffer is
+    # allocated again as it was before the arenas. Memory is the traced
+    # peak of a poll above what was live before it, blocks the change in
+    # live allocations over a poll.
+    poll(state)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if fresh:
+            _clear()
+        poll(state)
+    elapsed = (time.perf_counter() - start) / repeat * 1e3
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        if fresh:
+            _clear()
+        snapshot = _snapshot()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        poll(state)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        blocks.append(sum(
+            x.count_diff for x in _snapshot().compare_to(snapshot, 'filename')))
+    tracemalloc.stop()
+    return elapsed, float(np.mean(peaks)), float(np.mean(blocks))
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Leaves out the snapshots themselves.
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+def _clear():
+    for arena in _ARENAS:
+        arena.clear()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+import detectors.indicator
+import detectors.serial
+import solvers.memory
+from prototypes import GlyphMatcher
+
+# Glyphs recognized per game that has the module, and per call.
+_WORKLOADS = {
+    'MemorySymbols': (solvers.memory._ENGINE, 25, 5),
+    'SerialSymbols': (detectors.serial._ENGINE, 6, 6),
+    'IndicatorSymbols': (detectors.indicator._ENGINE, 6, 3),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--crops', default='crops',
+                        help='labelled crops, as written by --save-crops')
+    parser.add_argument('--max-distance', type=int)
+    parser.add_argument('--margin', type=int)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"model":18} {"crops":>6} {"hits":>7} {"correct":>7} '
+          f'{"match":>9} {"model":>9} {"saved/game":>10}')
+    for name, (engine, per_game, per_call) in _WORKLOADS.items():
+        # Every other crop of a label is a prototype, the rest are queries.
+        prototypes, prototype_labels, queries, query_labels = [], [], [], []
+        for label_dir in sorted(Path(args.crops, name).glob('*')):
+            for i, file in enumerate(sorted(label_dir.glob('*.png'))):
+                glyph = cv2.imread(str(file), cv2.IMREAD_GRAYSCALE)
+                if i % 2 == 0:
+                    prototypes.append(glyph)
+                    prototype_labels.append(int(label_dir.name))
+                else:
+                    queries.append(glyph)
+                    query_labels.append(int(label_dir.name))
+        if not prototypes or not queries:
+            print(f'{name:18} no crops')
+            continue
+
+        matcher = GlyphMatcher(
+            name, prototypes, prototype_labels, args.max_distance,
+            args.margin)
+        matched = matcher.match(queries)
+        hits = [i for i, x in enumerate(matched) if x is not None]
+        correct = sum(matched[i] == query_labels[i] for i in hits)
+
+        batch = queries[:per_call]
+        match_ms = _time(lambda: matcher.match(batch), args.repeat) \
+            / len(batch)
+        model_ms = _time(lambda: engine.predict(batch), args.repeat) \
+            / len(batch)
+        hit_rate = len(hits) / len(queries)
+        saved_ms = per_game * (hit_rate * model_ms - match_ms)
+        print(f'{name:18} {len(queries):6} {hit_rate:7.1%} '
+              f'{correct / max(len(hits), 1):7.1%} {match_ms:7.3f}ms '
+              f'{model_ms:7.3f}ms {saved_ms:8.2f}ms')
+
+def _time(function, repeat: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'source'))
+
+from detectors.timer import _SEGMENTS, detect_timer, locate_timer
+from utils import crop_image
+
+_TIMER_COLOR = (0, 0, 220)
+# Segments a to g as (x, y, w, h) relative to the top left of a digit.
+_SEGMENT_RECTS = (
+    (5, 0, 24, 7), (31, 8, 7, 40), (31, 57, 7, 40), (5, 98, 24, 7),
+    (-4, 57, 7, 40), (-4, 8, 7, 40), (5, 49, 24, 7))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', help='1920x1080 screenshot with the timer')
+    parser.add_argument('--position', type=int, nargs=2, default=(553, 209),
+                        help='where to draw the synthetic timer')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.image:
+        screen = cv2.imread(args.image)
+        digits = [None]
+        views = [screen]
+    else:
+        # The contour reader does not decode every digit of this font,
+        # the view the timer is located in shows digits it does.
+        digits = [[0, 5, 2, 0]]
+        digits += [rng.integers(0, 10, 4).tolist() for _ in range(args.count)]
+        views = [_render(x, args.position) for x in digits]
+
+    start = time.perf_counter()
+    reader = locate_timer(views[0])
+    locate_ms = (time.perf_counter() - start) * 1e3
+    if reader is None:
+        print('timer not found')
+        return
+    regions = [crop_image(x, reader.bbox) for x in views]
+
+    contour = []
+    for region in regions:
+        try:
+            contour.append(
+                detect_timer(cv2.cvtColor(region, cv2.COLOR_BGR2HSV)))
+        except IndexError:
+            contour.append(None)
+    sampled = []
+    for region in regions:
+        try:
+            sampled.append(reader.read(region))
+        except IndexError:
+            sampled.append(None)
+
+    region = regions[0]
+    contour_us = _time(
+        lambda: detect_timer(cv2.cvtColor(region, cv2.COLOR_BGR2HSV)),
+        args.repeat)
+    sampled_us = _time(lambda: reader.read(region), args.repeat)
+    print(f'bbox      {reader.bbox}, sampled {reader.is_sampled}')
+    print(f'locate    {locate_ms:7.2f} ms once per view')
+    print(f'contours  {contour_us:7.1f} us/read')
+    print(f'sampled   {sampled_us:7.1f} us/read')
+    if not args.image:
+        print(f'correct   contours {_correct(contour, digits)}, '
+              f'sampled {_correct(sampled, digits)} of {len(digits)}')
+
+def _render(digits, position) -> np.ndarray:
+    # A dark screen with a red button, a red strip and a seven segment
+    # timer showing digits at position.
+    screen = np.full((1080, 1920, 3), 30, np.uint8)
+    cv2.circle(screen, (980, 530), 60, _TIMER_COLOR, -1)
+    cv2.rectangle(screen, (1072, 480), (1086, 570), _TIMER_COLOR, -1)
+    x0, y0 = position[0] + 12, position[1] + 8
+    for k, digit in enumerate(digits):
+        x = x0 + k * 48 + (20 if k >= 2 else 0)
+        for i, (dx, dy, w, h) in enumerate(_SEGMENT_RECTS):
+            if _SEGMENTS[digit] >> i & 1:
+                cv2.rectangle(screen, (x+dx, y0+dy), (x+dx+w-1, y0+dy+h-1),
+                              _TIMER_COLOR, -1)
+    for dy in (30, 70):
+        cv2.rectangle(screen, (x0+100, y0+dy), (x0+110, y0+dy+11),
+                      _TIMER_COLOR, -1)
+    return screen
+
+def _correct(results, digits) -> int:
+    return sum(x == y for x, y in zip(results, digits))
+
+def _time(function, repeat: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+/* Measures the frame time of a GLX render loop while ktane_cap.so streams
+ * full frames. Run it through benchmark.sh. Usage:
+ *     benchmark <frames> <none|sync|async> */
+#define _GNU_SOURCE
+#include <fcntl.h>
+#include <unistd.h>
+
+#include <sys/mman.h>
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include <GL/gl.h>
+#include <GL/glx.h>
+#include <X11/Xlib.h>
+
+#include "ktane_shm.h"
+
+static uint64_t monotonic_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000ull + ts.tv_nsec;
+}
+
+static struct ktane_ctl *open_ctl() {
+    int fd = shm_open(KTANE_CTL_NAME, O_RDWR, 0666);
+    if (fd < 0)
+        return NULL;
+    return mmap(NULL, sizeof(struct ktane_ctl), PROT_READ|PROT_WRITE, MAP_SHARED, fd, 0);
+}
+
+static void draw(int frame) {
+    glClearColor((frame % 60) / 60.0f, 0.2f, 0.3f, 1.0f);
+    glClear(GL_COLOR_BUFFER_BIT);
+    glBegin(GL_TRIANGLES);
+    for (int i = 0; i < 64; i++) {
+        float x = (i % 8) / 4.0f - 1.0f, y = (i / 8) / 4.0f - 1.0f;
+        glColor3f(x, y, (frame % 30) / 30.0f);
+        glVertex2f(x, y);
+        glVertex2f(x + 0.5f, y);
+        glVertex2f(x, y + 0.5f);
+    }
+    glEnd();
+}
+
+int main(int argc, char **argv) {
+    if (argc != 3) {
+        fprintf(stderr, "usage: %s <frames> <none|sync|async>\n", argv[0]);
+        return 1;
+    }
+    int frames = atoi(argv[1]);
+    const char *mode = argv[2];
+
+    Display *dpy = XOpenDisplay(NULL);
+    if (!dpy) {
+        fprintf(stderr, "cannot open display\n");
+        return 1;
+    }
+
+    int attribs[] = {GLX_RGBA, GLX_DOUBLEBUFFER, GLX_RED_SIZE, 8, GLX_GREEN_SIZE, 8, GLX_BLUE_SIZE, 8, None};
+    XVisualInfo *vi = glXChooseVisual(dpy, DefaultScreen(dpy), attribs);
+    XSetWindowAttributes swa = {0};
+    swa.colormap = XCreateColormap(dpy, RootWindow(dpy, vi->screen), vi->visual, AllocNone);
+    Window win = XCreateWindow(dpy, RootWindow(dpy, vi->screen), 0, 0, KTANE_MAX_WIDTH, KTANE_MAX_HEIGHT, 0,
+                               vi->depth, InputOutput, vi->visual, CWColormap, &swa);
+    XMapWindow(dpy, win);
+    GLXContext ctx = glXCreateContext(dpy, vi, NULL, True);
+    glXMakeCurrent(dpy, win, ctx);
+
+    /* The first swap creates the shared memory segments. */
+    draw(0);
+    glXSwapBuffers(dpy, win);
+
+    struct ktane_ctl *ctl = open_ctl();
+    if (strcmp(mode, "none") != 0) {
+        if (!ctl) {
+            fprintf(stderr, "ktane_cap.so is not preloaded\n");
+            return 1;
+        }
+        ctl->rect_count = 0;
+        ctl->slot_count = 3;
+        ctl->async_readback = strcmp(mode, "async") == 0;
+        ctl->stream_interval = 1;
+    }
+
+    uint64_t start = monotonic_ns();
+    for (int i = 1; i <= frames; i++) {
+        draw(i);
+        glXSwapBuffers(dpy, win);
+    }
+    glFinish();
+    uint64_t elapsed = monotonic_ns() - start;
+
+    uint64_t readback = 0;
+    if (ctl && strcmp(mode, "none") != 0) {
+        ctl->stream_interval = 0;
+        readback = ctl->slots[ctl->latest].readback_ns;
+    }
+
+    printf("%-5s %8.3f ms/frame %8.1f fps  last readback %.3f ms\n", mode,
+           elapsed / 1e6 / frames, frames * 1e9 / elapsed, readback / 1e6);
+
+    glXMakeCurrent(dpy, None, NULL);
+    glXDestroyContext(dpy, ctx);
+    XDestroyWindow(dpy, win);
+    XCloseDisplay(dpy);
+    return 0;
+}
@@ -0,0 +1,7 @@
+# Compares synchronous and PBO readback under Mesa/llvmpipe on Xvfb.
+gcc -O2 -o benchmark benchmark.c -lGL -lX11 -lrt
+export LIBGL_ALWAYS_SOFTWARE=1 GALLIUM_DRIVER=llvmpipe vblank_mode=0
+for mode in none sync async; do
+    xvfb-run -a -s "-screen 0 1920x1080x24" \
+        env LD_PRELOAD=$PWD/ktane_cap.so ./benchmark ${1:-600} $mode
+done
@@ -5,33 +5,242 @@
 #include <fcntl.h>
 #include <unistd.h>
 
+#include <linux/futex.h>
 #include <sys/mman.h>
+#include <sys/syscall.h>
 
+#include <limits.h>
+
+#include <stddef.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <time.h>
 
 #include "dlsym_wrapper.h"
+#include "ktane_shm.h"
+
+#define GL_PACK_ALIGNMENT 0x0D05
+#define GL_BGR 0x80E0
+#define GL_UNSIGNED_BYTE 0x1401
+#define GL_PIXEL_PACK_BUFFER 0x88EB
+#define GL_PIXEL_PACK_BUFFER_BINDING 0x88ED
+#define GL_STREAM_READ 0x88E1
+#define GL_READ_ONLY 0x88B8
+#define GLX_WIDTH 0x801D
+#define GLX_HEIGHT 0x801E
 
 static pthread_mutex_t global_mutex = PTHREAD_MUTEX_INITIALIZER;
 
 static volatile DLSYM_PROC_T real_dlsym;
 static void * (* volatile real_glXGetProcAddressARB)(const char *);
 static void (* volatile real_glXSwapBuffers)(void *, void *);
+static void (* volatile real_glXQueryDrawable)(void *, void *, int, unsigned int *);
 static void (* volatile real_glReadPixels)(int, int, int, int, int, int, void *);
+static void (* volatile real_glGetIntegerv)(int, int *);
+static void (* volatile real_glPixelStorei)(int, int);
+static void (* volatile real_glGenBuffers)(int, unsigned int *);
+static void (* volatile real_glBindBuffer)(int, unsigned int);
+static void (* volatile real_glBufferData)(int, ptrdiff_t, const void *, int);
+static void * (* volatile real_glMapBuffer)(int, int);
+static unsigned char (* volatile real_glUnmapBuffer)(int);
+
+/* Readback issued into a pixel buffer object, copied out on the next swap. */
+struct pending_readback {
+    int active;
+    int stream;
+    unsigned int pbo;
+    size_t size;
+    uint32_t width;
+    uint32_t height;
+    uint64_t frame;
+    uint64_t swap_ns;
+    uint64_t issue_ns;
+};
+
+static unsigned int pbos[2];
+static unsigned int pbo_index;
+static struct pending_readback pending;
 
-static volatile int *ctl_buf;
+static struct ktane_ctl *ctl_buf;
 static char *img_buf;
 
 static void init_shm() {
-    int ctl = shm_open("ktane_ctl", O_RDWR|O_CREAT|O_TRUNC, 0666);
-    int img = shm_open("ktane_img", O_RDWR|O_CREAT|O_TRUNC, 0666);
+    int ctl = shm_open(KTANE_CTL_NAME, O_RDWR|O_CREAT|O_TRUNC, 0666);
+    int img = shm_open(KTANE_IMG_NAME, O_RDWR|O_CREAT|O_TRUNC, 0666);
+
+    ftruncate(ctl, sizeof(struct ktane_ctl));
+    ftruncate(img, KTANE_IMG_SIZE*KTANE_MAX_SLOTS);
+
+    ctl_buf = mmap(NULL, sizeof(struct ktane_ctl), PROT_READ|PROT_WRITE, MAP_SHARED, ctl, 0);
+    img_buf = mmap(NULL, KTANE_IMG_SIZE*KTANE_MAX_SLOTS, PROT_READ|PROT_WRITE, MAP_SHARED, img, 0);
+}
+
+static uint64_t monotonic_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000ull + ts.tv_nsec;
+}
+
+static void futex_wake(volatile uint32_t *addr) {
+    syscall(SYS_futex, addr, FUTEX_WAKE, INT_MAX, NULL, NULL, 0);
+}
+
+/* Reads the requested rectangles into dst, which is an offset into pbo
+ * when pbo is not 0. Returns the number of bytes written. */
+static size_t read_rects(unsigned int pbo, char *dst) {
+    int binding, alignment;
+    real_glGetIntegerv(GL_PIXEL_PACK_BUFFER_BINDING, &binding);
+    real_glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo);
+
+    size_t offset = 0;
+    int height = ctl_buf->height;
+    uint32_t count = ctl_buf->rect_count;
+    if (count > KTANE_MAX_RECTS)
+        count = KTANE_MAX_RECTS;
+
+    /* Rows of arbitrary rectangles are not 4-byte aligned. */
+    real_glGetIntegerv(GL_PACK_ALIGNMENT, &alignment);
+    real_glPixelStorei(GL_PACK_ALIGNMENT, 1);
+
+    if (count == 0) {
+        real_glReadPixels(0, 0, ctl_buf->width, height, GL_BGR, GL_UNSIGNED_BYTE, dst);
+        offset = (size_t)ctl_buf->width * height * 3;
+    }
+
+    for (uint32_t i = 0; i < count; i++) {
+        struct ktane_rect r = ctl_buf->rects[i];
+        size_t size = (size_t)r.w * r.h * 3;
+        if (r.w <= 0 || r.h <= 0 || offset + size > KTANE_IMG_SIZE)
+            break;
+        real_glReadPixels(r.x, height - r.y - r.h, r.w, r.h, GL_BGR, GL_UNSIGNED_BYTE, dst + offset);
+        offset += size;
+    }
+
+    real_glPixelStorei(GL_PACK_ALIGNMENT, alignment);
+    real_glBindBuffer(GL_PIXEL_PACK_BUFFER, binding);
+    return offset;
+}
+
+static uint32_t next_slot() {
+    uint32_t count = ctl_buf->slot_count;
+    if (count < 2 || count > KTANE_MAX_SLOTS)
+        count = KTANE_MAX_SLOTS;
+    return (ctl_buf->latest + 1) % count;
+}
+
+static void begin_slot(uint32_t index) {
+    __atomic_add_fetch(&ctl_buf->slots[index].seq, 1, __ATOMIC_ACQ_REL);
+}
+
+static void end_slot(uint32_t index, uint32_t width, uint32_t height,
+                     uint64_t frame, uint64_t swap_ns, uint64_t readback_ns) {
+    struct ktane_slot *slot = &ctl_buf->slots[index];
+    slot->width = width;
+    slot->height = height;
+    slot->frame = frame;
+    slot->swap_ns = swap_ns;
+    slot->readback_ns = readback_ns;
+    slot->latency = ctl_buf->frame - frame;
+    __atomic_add_fetch(&slot->seq, 1, __ATOMIC_ACQ_REL);
+}
 
-    ftruncate(ctl, 4);
-    ftruncate(img, 1920*1080*3);
+static void publish(int stream, uint32_t index) {
+    if (stream) {
+        __atomic_store_n(&ctl_buf->latest, index, __ATOMIC_RELEASE);
+        __atomic_add_fetch(&ctl_buf->published, 1, __ATOMIC_RELEASE);
+        futex_wake(&ctl_buf->published);
+    } else {
+        __atomic_store_n(&ctl_buf->request, 0, __ATOMIC_RELEASE);
+        futex_wake(&ctl_buf->request);
+    }
+}
+
+static void read_sync(int stream, uint64_t frame, uint64_t swap_ns) {
+    uint32_t index = stream ? next_slot() : 0;
+    begin_slot(index);
+    read_rects(0, img_buf + (size_t)index * KTANE_IMG_SIZE);
+    end_slot(index, ctl_buf->width, ctl_buf->height, frame, swap_ns, monotonic_ns() - swap_ns);
+    publish(stream, index);
+}
+
+static void start_async(int stream, uint64_t frame, uint64_t swap_ns) {
+    if (!pbos[0]) {
+        int binding;
+        real_glGetIntegerv(GL_PIXEL_PACK_BUFFER_BINDING, &binding);
+        real_glGenBuffers(2, pbos);
+        for (int i = 0; i < 2; i++) {
+            real_glBindBuffer(GL_PIXEL_PACK_BUFFER, pbos[i]);
+            real_glBufferData(GL_PIXEL_PACK_BUFFER, KTANE_IMG_SIZE, NULL, GL_STREAM_READ);
+        }
+        real_glBindBuffer(GL_PIXEL_PACK_BUFFER, binding);
+    }
+
+    pending.pbo = pbos[pbo_index];
+    pending.size = read_rects(pending.pbo, NULL);
+    pending.width = ctl_buf->width;
+    pending.height = ctl_buf->height;
+    pending.active = 1;
+    pending.stream = stream;
+    pending.frame = frame;
+    pending.swap_ns = swap_ns;
+    pending.issue_ns = monotonic_ns() - swap_ns;
+    pbo_index ^= 1;
+}
+
+static void finish_async(int stream) {
+    pending.active = 0;
+    /* Capture mode changed while the readback was in flight. */
+    if (pending.stream != stream)
+        return;
+
+    uint64_t start = monotonic_ns();
+    int binding;
+    real_glGetIntegerv(GL_PIXEL_PACK_BUFFER_BINDING, &binding);
+    real_glBindBuffer(GL_PIXEL_PACK_BUFFER, pending.pbo);
+
+    void *pixels = real_glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY);
+    if (pixels) {
+        uint32_t index = stream ? next_slot() : 0;
+        begin_slot(index);
+        memcpy(img_buf + (size_t)index * KTANE_IMG_SIZE, pixels, pending.size);
+        real_glUnmapBuffer(GL_PIXEL_PACK_BUFFER);
+        end_slot(index, pending.width, pending.height, pending.frame, pending.swap_ns,
+                 pending.issue_ns + monotonic_ns() - start);
+        publish(stream, index);
+    }
 
-    ctl_buf = mmap(NULL, 4, PROT_READ|PROT_WRITE, MAP_SHARED, ctl, 0);
-    img_buf = mmap(NULL, 1920*1080*3, PROT_READ|PROT_WRITE, MAP_SHARED, img, 0);
+    real_glBindBuffer(GL_PIXEL_PACK_BUFFER, binding);
+}
+
+static void update_size(void *dpy, void *drawable) {
+    unsigned int width = KTANE_MAX_WIDTH, height = KTANE_MAX_HEIGHT;
+    if (real_glXQueryDrawable) {
+        real_glXQueryDrawable(dpy, drawable, GLX_WIDTH, &width);
+        real_glXQueryDrawable(dpy, drawable, GLX_HEIGHT, &height);
+    }
+    ctl_buf->width = width < KTANE_MAX_WIDTH ? width : KTANE_MAX_WIDTH;
+    ctl_buf->height = height < KTANE_MAX_HEIGHT ? height : KTANE_MAX_HEIGHT;
+}
+
+static void capture(void *dpy, void *drawable) {
+    uint64_t swap_ns = monotonic_ns();
+    update_size(dpy, drawable);
+    uint64_t frame = ++ctl_buf->frame;
+
+    uint32_t interval = ctl_buf->stream_interval;
+    int stream = interval != 0;
+
+    if (pending.active)
+        finish_async(stream);
+
+    if (stream ? frame % interval != 0 : ctl_buf->request != 1)
+        return;
+
+    if (ctl_buf->async_readback)
+        start_async(stream, frame, swap_ns);
+    else
+        read_sync(stream, frame, swap_ns);
 }
 
 static DLSYM_PROC_T get_dlsym() {
@@ -42,19 +251,32 @@ extern void glXSwapBuffers(void *dpy, void *drawable) {
     if (!real_glXSwapBuffers) {
         pthread_mutex_lock(&global_mutex);
         if (!real_glXSwapBuffers) {
-            real_glXSwapBuffers = dlsym(RTLD_NEXT, "glXSwapBuffers");
-            real_glReadPixels = dlsym(RTLD_NEXT, "glReadPixels");
+            /* Our dlsym and glXGetProcAddressARB take the same lock, so
+             * resolve through the real ones. */
+            if (!real_dlsym)
+                real_dlsym = get_dlsym();
+            if (!real_glXGetProcAddressARB)
+                real_glXGetProcAddressARB = real_dlsym(RTLD_NEXT, "glXGetProcAddressARB");
+
+            real_glXQueryDrawable = real_dlsym(RTLD_NEXT, "glXQueryDrawable");
+            real_glReadPixels = real_dlsym(RTLD_NEXT, "glReadPixels");
+            real_glGetIntegerv = real_dlsym(RTLD_NEXT, "glGetIntegerv");
+            real_glPixelStorei = real_dlsym(RTLD_NEXT, "glPixelStorei");
+            real_glGenBuffers = real_glXGetProcAddressARB("glGenBuffers");
+            real_glBindBuffer = real_glXGetProcAddressARB("glBindBuffer");
+            real_glBufferData = real_glXGetProcAddressARB("glBufferData");
+            real_glMapBuffer = real_glXGetProcAddressARB("glMapBuffer");
+            real_glUnmapBuffer = real_glXGetProcAddressARB("glUnmapBuffer");
 
             init_shm();
+            /* Set last, other threads skip the lock once it is set. */
+            real_glXSwapBuffers = real_dlsym(RTLD_NEXT, "glXSwapBuffers");
         }
         pthread_mutex_unlock(&global_mutex);
     }
 
-    if (*ctl_buf == 1) {
-        real_glReadPixels(0, 0, 1920, 1080, 0x80E0, 0x1401, img_buf);
-        *ctl_buf = 0;
-    }
-    
+    capture(dpy, drawable);
+
     return real_glXSwapBuffers(dpy, drawable);
 }
 
@@ -0,0 +1,67 @@
+#ifndef KTANE_SHM_H
+#define KTANE_SHM_H
+
+#include <stdint.h>
+
+#define KTANE_CTL_NAME "ktane_ctl"
+#define KTANE_IMG_NAME "ktane_img"
+
+/* Largest drawable that fits into an image slot. */
+#define KTANE_MAX_WIDTH 1920
+#define KTANE_MAX_HEIGHT 1080
+#define KTANE_IMG_SIZE (KTANE_MAX_WIDTH*KTANE_MAX_HEIGHT*3)
+
+#define KTANE_MAX_RECTS 16
+#define KTANE_MAX_SLOTS 4
+
+/* Rectangle in screen coordinates, origin at the top-left corner. */
+struct ktane_rect {
+    int32_t x, y, w, h;
+};
+
+/* Metadata of the frame held by one image slot. seq is odd while the
+ * hook is writing the slot. Timestamps use CLOCK_MONOTONIC. latency is
+ * the number of swaps between the captured frame and its publication. */
+struct ktane_slot {
+    volatile uint32_t seq;
+    uint32_t latency;
+    uint64_t frame;
+    uint64_t swap_ns;
+    uint64_t readback_ns;
+    uint32_t width;
+    uint32_t height;
+};
+
+/* Layout must match _Control in source/screen_capture/linux_hook.py.
+ * rect_count == 0 requests the full frame, otherwise the rectangles are
+ * read back one after another into an image slot of KTANE_IMG_SIZE bytes.
+ *
+ * Request mode: the hook fills slot 0, clears request and wakes futex
+ * waiters on it.
+ * Stream mode (stream_interval > 0): every stream_interval-th swap is
+ * read into the next of slot_count slots, latest is set to that slot and
+ * published is incremented, waking futex waiters on it.
+ *
+ * With async_readback set, pixels are read into a pixel buffer object and
+ * copied into the slot on the following swap.
+ *
+ * width and height hold the size of the drawable at the last swap, clamped
+ * to KTANE_MAX_WIDTH x KTANE_MAX_HEIGHT. Full frames are read at that size. */
+struct ktane_ctl {
+    volatile uint32_t request;
+    uint32_t rect_count;
+    struct ktane_rect rects[KTANE_MAX_RECTS];
+
+    volatile uint32_t stream_interval;
+    uint32_t slot_count;
+    volatile uint32_t latest;
+    volatile uint32_t published;
+    uint32_t async_readback;
+    uint32_t reserved;
+    uint32_t width;
+    uint32_t height;
+    uint64_t frame;
+    struct ktane_slot slots[KTANE_MAX_SLOTS];
+};
+
+#endif
@@ -1,13 +1,16 @@
 import enum
 from pathlib import Path
+from typing import Optional, Sequence
 
 import torch
+from frame import Frame
+from inference import InferenceEngine
 from models.bomb_modules import BombModules as Model
 from numpy.typing import NDArray
-from utils import bgr2tensor
 
-_MODEL = Model().eval()
-_MODEL.load_state_dict(torch.load(Path('models/BombModules.pt')))
+_ENGINE = InferenceEngine(
+    Model, Path('models/BombModules.pt'), input_size=(272, 262),
+    prototypes=True)
 
 class BombModuleType(enum.IntEnum):
     BUTTON = 0
@@ -27,7 +30,17 @@ class BombModuleType(enum.IntEnum):
     WIRES = enum.auto()
     WIRE_SEQUENCES = enum.auto()
 
-@torch.no_grad()
-def detect_module_type(bgr_image: NDArray) -> BombModuleType:
-    image = bgr2tensor(bgr_image)
-    return BombModuleType(_MODEL(image).argmax().item())
+def detect_module_type(bgr_image: NDArray | Frame) -> BombModuleType:
+    return BombModuleType(_ENGINE.predict((bgr_image,))[0])
+
+def detect_module_types(
+        bgr_images: Sequence[NDArray | Frame],
+        batched: Optional[bool] = None) -> list[BombModuleType]:
+    # One batch pads the slots to the largest slot size. It only
+    # pays off with several threads, on a single core it is slower than
+    # classifying each slot, so by default it is used with several threads.
+    if batched is None:
+        batched = torch.get_num_threads() > 1
+    if batched:
+        return [BombModuleType(x) for x in _ENGINE.predict(bgr_images)]
+    return [detect_module_type(x) for x in bgr_images]
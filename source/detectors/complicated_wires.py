@@ -1,11 +1,15 @@
-from typing import Sequence
+import logging
+from typing import Optional, Sequence
 
 import cv2
 import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
+from segmentation import ColorSegmenter, Segmentation
 from utils import (crop_image, draw_contour_mask, filter_contours_by_area,
                    find_contours, get_centroid)
 
+_LOGGER = logging.getLogger('cascade')
 _MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
 
 _CR_STAR_BACKGROUND = ((14, 87, 102), (26, 255, 199))
@@ -15,20 +19,169 @@ _CR_RED_WIRE = ((0, 194, 117), (12, 255, 255))
 _CR_BLUE_WIRE = ((103, 146, 89), (121, 255, 255))
 _CR_WHITE_WIRE = ((0, 0, 136), (32, 63, 255))
 _CR_RED_MIX = ((136, 132, 75), (179, 255, 255))
+_SEGMENTER = ColorSegmenter({
+    'star_background': _CR_STAR_BACKGROUND,
+    'lit_led': _CR_LIT_LED,
+    'unlit_led': _CR_UNLIT_LED,
+    'red_wire': _CR_RED_WIRE,
+    'blue_wire': _CR_BLUE_WIRE,
+    'white_wire': _CR_WHITE_WIRE,
+    'red_mix': _CR_RED_MIX,
+})
 
 _THRESH_STAR_AREA = 0.9
 _THRESH_LIT_LED = 50
 _THRESH_UNLIT_LED = 15
 _THRESH_DISTANCE = 16
 
-def detect_complicated_wires(hsv_image: NDArray) -> list[bool, bool, str]:
-    stars = _detect_stars(hsv_image)
-    leds = _detect_leds(hsv_image)
-    red_wires = _detect_red_wires(hsv_image)
-    blue_wires, blue_mask = _detect_blue_wires(hsv_image)
-    white_wires, white_mask = _detect_white_wires(hsv_image)
+# Wires end above the middle of their star box. Strips run over this
+# span of the way from the LED down to the top of the star box.
+_STRIP_SPAN = (0.74, 0.94)
+_STRIP_LENGTH = 41
+_STRIP_DX = (-2, 0, 2)
+_LED_RADIUS = 2
+_STAR_INSET = 4
+_STAR_CENTER = (0.35, 0.42, 0.5, 0.58, 0.65)
+_STAR_EDGE = (0.1, 0.3, 0.5, 0.7, 0.9)
+
+# Fractions of the samples of a slot that make a decision, anything in
+# between falls back to the contour path.
+_THRESH_WIRE = (0.1, 0.5)
+_THRESH_WIRE_COLOR = (0.03, 0.15)
+_THRESH_LED = 0.6
+_THRESH_STAR = (0.6, 0.9)
+_THRESH_STAR_EDGE = 0.8
+
+_WIRE_COLORS = ('b', 'r', 'w')
+_WIRE_NAMES = {
+    ('b',): 'b', ('r',): 'r', ('w',): 'w',
+    ('b', 'w'): 'bw', ('r', 'w'): 'rw', ('b', 'r'): 'br'}
+
+# Sampled pixels per frame shape, learned from the first frame of that
+# shape the contour path and the sampled detector agree on: frame shape,
+# x and y of every sample and the number of samples per slot of each
+# group. Samples learned from an offset view keep falling back, after
+# this many fallbacks in a row they are learned again.
+_Samples = tuple[tuple[int, ...], NDArray, NDArray, tuple[int, ...]]
+_SAMPLES: dict[tuple[int, ...], _Samples] = {}
+_FALLBACKS: dict[tuple[int, ...], int] = {}
+_RELEARN_FALLBACKS = 3
+
+def detect_complicated_wires(frame: Frame) -> list[bool, bool, str]:
+    # Samples a few pixels per slot once their positions are known, the
+    # full contour path runs when any of them is ambiguous.
+    shape = frame.shape
+    if shape in _SAMPLES:
+        result = _detect_sampled(frame, _SAMPLES[shape])
+        _LOGGER.debug(
+            'ComplicatedWires %s',
+            'fallback' if result is None else 'sampled')
+        if result is not None:
+            _FALLBACKS[shape] = 0
+            return result
+        _FALLBACKS[shape] += 1
+        if _FALLBACKS[shape] >= _RELEARN_FALLBACKS:
+            _LOGGER.debug('ComplicatedWires relearning samples')
+            del _SAMPLES[shape]
+
+    result, samples = _detect_contours(frame)
+    if shape not in _SAMPLES and samples is not None \
+            and _detect_sampled(frame, samples) == [list(x) for x in result]:
+        _SAMPLES[shape] = samples
+        _FALLBACKS[shape] = 0
+    return result
+
+def _detect_sampled(
+        frame: Frame, samples: _Samples) -> Optional[list[bool, bool, str]]:
+    _, xs, ys, sizes = samples
+    segmentation = _SEGMENTER.segment(frame.image[ys, xs][:, None])
+    strips, leds, stars, edges = np.split(
+        np.arange(len(xs)), np.cumsum(np.multiply(sizes, 6))[:-1])
+
+    def fractions(name, group):
+        return (segmentation[name][group, 0] > 0).reshape(6, -1).mean(axis=1)
+
+    red = fractions('red_wire', strips) + fractions('red_mix', strips)
+    colors = np.stack(
+        [fractions('blue_wire', strips), red, fractions('white_wire', strips)])
+    wire = np.minimum(colors.sum(axis=0), 1)
+    shares = colors / np.maximum(wire, 1e-6)
+    lit = fractions('lit_led', leds)
+    unlit = fractions('unlit_led', leds)
+    star = fractions('star_background', stars)
+    edge = fractions('star_background', edges)
+
+    low, high = _THRESH_WIRE_COLOR
+    ambiguous = ((wire >= _THRESH_WIRE[0]) & (wire < _THRESH_WIRE[1])) \
+        | (((shares >= low) & (shares < high)).any(axis=0)
+           & (wire >= _THRESH_WIRE[0])) \
+        | ((lit < _THRESH_LED) & (unlit < _THRESH_LED)) \
+        | ((star > _THRESH_STAR[0]) & (star < _THRESH_STAR[1])) \
+        | (edge < _THRESH_STAR_EDGE)
+    if ambiguous.any():
+        return None
+
+    result = []
+    for i in range(6):
+        color = ''
+        if wire[i] >= _THRESH_WIRE[1]:
+            present = tuple(
+                x for x, share in zip(_WIRE_COLORS, shares[:, i])
+                if share >= high)
+            if present not in _WIRE_NAMES:
+                return None
+            color = _WIRE_NAMES[present]
+        result.append([bool(lit[i] >= _THRESH_LED),
+                       bool(star[i] <= _THRESH_STAR[0]), color])
+    return result
+
+def _sample_points(
+        shape: tuple[int, ...], stars: Sequence[Sequence[int]],
+        leds: Sequence[Sequence[float]]) -> Optional[_Samples]:
+    # Vertical strips above each star box, a square around each LED, a
+    # grid in the middle of each star box and points along its edges.
+    leds = np.array(leds, dtype=float)
+    boxes = np.array(stars, dtype=float)
+    t = np.linspace(*_STRIP_SPAN, _STRIP_LENGTH)
+    ys = leds[:, 1, None] + t * (boxes[:, 1, None] - leds[:, 1, None])
+    xs = boxes[:, 0] + boxes[:, 2] / 2
+    strips = np.stack(np.broadcast_arrays(
+        xs[:, None, None] + np.array(_STRIP_DX)[:, None],
+        ys[:, None, :]), axis=-1).reshape(6, -1, 2)
+
+    r = np.arange(-_LED_RADIUS, _LED_RADIUS+1)
+    offsets = np.stack(np.meshgrid(r, r), axis=-1).reshape(-1, 2)
+    leds = np.round(leds).astype(int)[:, None] + offsets
+
+    boxes[:, :2] += _STAR_INSET
+    boxes[:, 2:] -= 2*_STAR_INSET + 1
+    t = np.array([(x, y) for x in _STAR_CENTER for y in _STAR_CENTER])
+    centers = boxes[:, None, :2] + t * boxes[:, None, 2:]
+    t = np.array(_STAR_EDGE)
+    t = np.concatenate([
+        np.stack([t, np.zeros_like(t)], 1), np.stack([t, np.ones_like(t)], 1),
+        np.stack([np.zeros_like(t), t], 1), np.stack([np.ones_like(t), t], 1)])
+    edges = boxes[:, None, :2] + t * boxes[:, None, 2:]
+
+    groups = [np.round(strips).astype(int), leds,
+              np.round(centers).astype(int), np.round(edges).astype(int)]
+    points = np.concatenate([x.reshape(-1, 2) for x in groups])
+    if (points < 0).any() or (points[:, 0] >= shape[1]).any() \
+            or (points[:, 1] >= shape[0]).any():
+        return None
+    return (tuple(shape), points[:, 0], points[:, 1],
+            tuple(x.shape[1] for x in groups))
+
+def _detect_contours(
+        frame: Frame) -> tuple[list[bool, bool, str], Optional[_Samples]]:
+    segmentation = _SEGMENTER.segment(frame)
+    stars = _detect_stars(segmentation)
+    leds = _detect_leds(segmentation)
+    red_wires = _detect_red_wires(segmentation)
+    blue_wires, blue_mask = _detect_blue_wires(segmentation)
+    white_wires, white_mask = _detect_white_wires(segmentation)
     
-    red_mask = cv2.inRange(hsv_image, *_CR_RED_MIX)
+    red_mask = segmentation['red_mix']
     blue_white_wires = _detect_mixed_wires(blue_mask | white_mask)
     red_white_wires = _detect_mixed_wires(red_mask | white_mask)
     blue_red_wires = _detect_mixed_wires(blue_mask | red_mask)
@@ -41,8 +194,13 @@ def detect_complicated_wires(hsv_image: NDArray) -> list[bool, bool, str]:
     wires += [('br', c) for c in blue_red_wires]
     wires.sort(key=lambda x: x[1][:, :, 0].min())
     
+    samples = None
+    if len(stars) == 6 and len(leds) == 6 and leds[0][1] is not None:
+        samples = _sample_points(
+            frame.shape, [x[1] for x in stars], [x[1] for x in leds])
+
     result = []
-    for star, led in zip(stars, leds):
+    for star, (led, _) in zip(stars, leds):
         if not wires:
             result.append((led, star[0], ''))
             continue
@@ -55,23 +213,25 @@ def detect_complicated_wires(hsv_image: NDArray) -> list[bool, bool, str]:
             result.append([led, star[0], wires.pop(0)[0]])
         else:
             result.append([led, star[0], ''])
-    return result
+    return result, samples
 
 
-def _detect_red_wires(hsv_image: NDArray) -> NDArray:
-    contours = find_contours(cv2.inRange(hsv_image, *_CR_RED_WIRE))
+def _detect_red_wires(segmentation: Segmentation) -> NDArray:
+    contours = find_contours(segmentation['red_wire'])
     return filter_contours_by_area(contours, 100)
 
-def _detect_blue_wires(hsv_image: NDArray) -> tuple[NDArray, NDArray]:
-    mask = cv2.inRange (hsv_image, *_CR_BLUE_WIRE)
+def _detect_blue_wires(
+        segmentation: Segmentation) -> tuple[NDArray, NDArray]:
+    mask = segmentation['blue_wire']
     contours = find_contours(mask)
     contours = filter_contours_by_area(contours, 100)
     contours = [c for c in contours if c[:, :, 1].max() - c[:, :, 1].min() >= 100]
     mask &= ~cv2.drawContours(np.zeros_like(mask), contours, -1, 255, -1)
     return contours, mask
 
-def _detect_white_wires(hsv_image: NDArray) -> tuple[NDArray, NDArray]:
-    mask = cv2.inRange(hsv_image, *_CR_WHITE_WIRE)
+def _detect_white_wires(
+        segmentation: Segmentation) -> tuple[NDArray, NDArray]:
+    mask = segmentation['white_wire']
     contours = find_contours(mask)
     contours = filter_contours_by_area(contours, 100)
     contours = [c for c in contours if c[:, :, 1].max() - c[:, :, 1].min() >= 100]
@@ -84,8 +244,9 @@ def _detect_mixed_wires(mask: NDArray) -> NDArray:
     contours = [c for c in contours if c[:, :, 1].max() - c[:, :, 1].min() >= 100]
     return contours
 
-def _detect_stars(hsv_image: NDArray) -> list[tuple[bool, Sequence[int]]]:
-    mask = cv2.inRange(hsv_image, *_CR_STAR_BACKGROUND)
+def _detect_stars(
+        segmentation: Segmentation) -> list[tuple[bool, Sequence[int]]]:
+    mask = segmentation['star_background']
     dilated = cv2.dilate(mask, _MORPH_KERNEL)
     contours = sorted(find_contours(dilated), key=cv2.contourArea)[:-7:-1]
     contours.sort(key=lambda c: c[:, :, 0].min())
@@ -100,13 +261,15 @@ def _detect_stars(hsv_image: NDArray) -> list[tuple[bool, Sequence[int]]]:
         result.append((cv2.countNonZero(star) / area < _THRESH_STAR_AREA, bbox))
     return result
 
-def _detect_leds(hsv_image: NDArray) -> list[bool]:
-    mask = cv2.inRange(hsv_image, *_CR_LIT_LED)
+def _detect_leds(
+        segmentation: Segmentation) -> list[tuple[bool, Optional[NDArray]]]:
+    # Centroids are unknown when no LED is lit.
+    mask = segmentation['lit_led']
     lit_contours = filter_contours_by_area(find_contours(mask), _THRESH_LIT_LED)
     if len(lit_contours) == 0:
-        return [False] * 6
+        return [(False, None)] * 6
     
-    mask = cv2.inRange(hsv_image, *_CR_UNLIT_LED)
+    mask = segmentation['unlit_led']
     cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _MORPH_KERNEL, dst=mask)
     unlit_contours = filter_contours_by_area(find_contours(mask), _THRESH_UNLIT_LED)
 
@@ -119,4 +282,4 @@ def _detect_leds(hsv_image: NDArray) -> list[bool]:
         if np.abs(unlit_centroid[1] - center) < 5.0:
             leds.append((False, unlit_centroid))
     leds.sort(key=lambda x: x[1][0])
-    return [x[0] for x in leds]
+    return leds
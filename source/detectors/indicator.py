@@ -3,15 +3,17 @@ from typing import Sequence
 
 import cv2
 import numpy as np
-import torch
+from frame import Frame
+from glyphs import GlyphResult, GlyphService
+from inference import InferenceEngine
 from models.symbols import Symbols as Model
 from numpy.typing import NDArray
 from utils import (bgr2gray, crop_image, draw_contour_mask,
-                   filter_contours_by_area, find_contours, fit_image_size,
-                   gray2tensor, tensors2batch)
+                   filter_contours_by_area, find_contours)
 
-_MODEL = Model(16).eval()
-_MODEL.load_state_dict(torch.load(Path('models/IndicatorSymbols.pt')))
+_ENGINE = InferenceEngine(
+    lambda: Model(16), Path('models/IndicatorSymbols.pt'), (64, 64),
+    prototypes=True)
 _LABELS = 'ABCDFGIKLMNOQRST'
 
 _CR_BORDER = ((0, 30, 0), (6, 255, 232))
@@ -22,27 +24,24 @@ _THREH_BLOB_COLOR = 160
 _THRESH_BLOB_AREA = 100
 _MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
 
-def detect_indicators(
-        bgr_image: NDArray,
-        hsv_image: NDArray) -> list[tuple[bool | str]]:
-    indicators = _filter(bgr_image, hsv_image, _find(hsv_image))
-    if not indicators:
-        return []
-    
+def detect_indicators(frame: Frame) -> list[tuple[bool | str]]:
+    return request_indicators(frame, GlyphService()).get()
+
+def request_indicators(frame: Frame, glyphs: GlyphService) -> GlyphResult:
+    indicators = _filter(frame, _find(frame.hsv))
     is_lit = []
-    batch = []
+    images = []
     for indicator in indicators:
         is_lit.append(indicator[0])
-        for image in indicator[1:]:
-            batch.append(gray2tensor(fit_image_size(image, 64, 64)))
-    batch = tensors2batch(batch)
-    prediction = _MODEL(batch).argmax(dim=1).tolist()
+        images += indicator[1:]
 
-    result = []
-    for i, lit in enumerate(is_lit):
-        text = ''.join(_LABELS[x] for x in prediction[i * 3 : i * 3 + 3])
-        result.append((lit, text))
-    return result
+    def decode(prediction: list[int]) -> list[tuple[bool | str]]:
+        result = []
+        for i, lit in enumerate(is_lit):
+            text = ''.join(_LABELS[x] for x in prediction[i * 3 : i * 3 + 3])
+            result.append((lit, text))
+        return result
+    return glyphs.submit(_ENGINE, images, decode)
 
 def _find(hsv_image: NDArray) -> Sequence[NDArray]:
     mask = cv2.inRange(hsv_image, *_CR_BORDER)
@@ -50,21 +49,20 @@ def _find(hsv_image: NDArray) -> Sequence[NDArray]:
     return find_contours(mask)
 
 def _filter(
-        bgr_image: NDArray, hsv_image: NDArray,
-        contours: Sequence[NDArray]) -> list[list[bool | NDArray]]:
+        frame: Frame, contours: Sequence[NDArray]) -> list[list[bool | NDArray]]:
     result = []
     for contour in contours:
         if cv2.contourArea(contour) < _THRESH_BORDER_AREA:
             continue
 
         bbox = cv2.boundingRect(contour)
-        mask = cv2.inRange(crop_image(hsv_image, bbox), *_CR_LETTERS)
+        mask = cv2.inRange(crop_image(frame, bbox).hsv, *_CR_LETTERS)
         contours = filter_contours_by_area(
             find_contours(mask), _THRESH_LETTER)
         if len(contours) != 3:
             continue
 
-        gray = bgr2gray(crop_image(bgr_image, bbox))
+        gray = bgr2gray(crop_image(frame, bbox))
         mask = draw_contour_mask(
             np.zeros_like(gray), contour, offset=(-bbox[0], -bbox[1]))
         _, blobs = cv2.threshold(
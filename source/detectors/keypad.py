@@ -1,27 +1,28 @@
 import cv2
 import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
-from utils import bgr2gray, crop_image, draw_contour_mask, find_contours
+from utils import Blobs, bgr2gray, crop_image, find_blobs
 
 _CR_BACKGROUND = ((0, 0, 194), (30, 46, 255))
 
-def detect_keypad(bgr_image: NDArray, hsv_image: NDArray) -> list[NDArray]:
-    mask = cv2.inRange(hsv_image, *_CR_BACKGROUND)
-    contours = sorted(find_contours(mask), key=cv2.contourArea)[:-5:-1]
+def detect_keypad(frame: Frame) -> list[NDArray]:
+    mask = cv2.inRange(frame.hsv, *_CR_BACKGROUND)
+    blobs = find_blobs(mask)
+    blobs = blobs[np.argsort(-blobs.area, kind='stable')[:4]]
 
     result = []
-    contours.sort(key=lambda x: x[:,:,1].min())
-    top = sorted(contours[:2], key=lambda x: x[:,:,0].min())
-    bot = sorted(contours[2:], key=lambda x: x[:,:,0].min())
-    for contour in top+bot:
-        result.append(_extract_symbol(bgr_image, contour))
+    blobs = blobs[np.argsort(blobs.y, kind='stable')]
+    top = blobs[:2][np.argsort(blobs.x[:2], kind='stable')]
+    bot = blobs[2:][np.argsort(blobs.x[2:], kind='stable')]
+    for row in (top, bot):
+        for i in range(len(row)):
+            result.append(_extract_symbol(frame, row, i))
     return result
 
-def _extract_symbol(bgr_image: NDArray, contour: NDArray) -> NDArray:
-    bbox = cv2.boundingRect(contour)
-    gray = bgr2gray(crop_image(bgr_image, bbox))
-    mask = draw_contour_mask(
-        np.zeros_like(gray), contour, offset=(-bbox[0], -bbox[1]))
+def _extract_symbol(frame: Frame, blobs: Blobs, i: int) -> NDArray:
+    gray = bgr2gray(crop_image(frame, blobs.bbox(i)))
+    mask = blobs.filled_image(i)
 
     _, gray = cv2.threshold(
         gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
@@ -1,17 +1,18 @@
 import cv2
 import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
 from utils import bgr2gray, crop_image, draw_contour_mask, find_contours
 
 _CR_BACKGROUND = ((34, 207, 169), (58, 255, 255))
 _MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
 
-def detect_password(bgr_image: NDArray, hsv_image: NDArray) -> list[NDArray]:
-    mask = cv2.inRange(hsv_image, *_CR_BACKGROUND)
+def detect_password(frame: Frame) -> list[NDArray]:
+    mask = cv2.inRange(frame.hsv, *_CR_BACKGROUND)
     contour = max(find_contours(mask), key=lambda x: cv2.contourArea(x))
 
     bbox = cv2.boundingRect(contour)
-    gray = bgr2gray(crop_image(bgr_image, bbox))
+    gray = bgr2gray(crop_image(frame, bbox))
     mask = draw_contour_mask(
         np.zeros_like(gray), contour, offset=(-bbox[0], -bbox[1]))
     
@@ -3,14 +3,16 @@ from typing import Optional, Sequence
 
 import cv2
 import numpy as np
-import torch
+from frame import Frame
+from glyphs import GlyphResult, GlyphService
+from inference import InferenceEngine
 from models.symbols import Symbols as Model
 from numpy.typing import NDArray
-from utils import (bgr2gray, crop_image, draw_contour_mask, find_contours,
-                   fit_image_size, gray2tensor, tensors2batch)
+from utils import bgr2gray, crop_image, draw_contour_mask, find_contours
 
-_MODEL = Model(34).eval()
-_MODEL.load_state_dict(torch.load(Path('models/SerialSymbols.pt')))
+_ENGINE = InferenceEngine(
+    lambda: Model(34), Path('models/SerialSymbols.pt'), (64, 64),
+    prototypes=True)
 _LABELS = '0123456789ABCDEFGHIJKLMNPQRSTUVWXZ'
 
 _CR_BORDER = ((0, 0, 109), (36, 43, 255))
@@ -19,15 +21,18 @@ _THRESH_BLOB_COLOR = 50
 _THRESH_BLOB_AREA = 100
 _MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
 
-def detect_serial(
-        bgr_image: NDArray, hsv_image: NDArray) -> Optional[str]:
-    images = _filter(bgr_image, _find(hsv_image))
+def detect_serial(frame: Frame) -> Optional[str]:
+    result = request_serial(frame, GlyphService())
+    return None if result is None else result.get()
+
+def request_serial(
+        frame: Frame, glyphs: GlyphService) -> Optional[GlyphResult]:
+    images = _filter(frame, _find(frame.hsv))
     if not images:
         return None
-    
-    batch = [gray2tensor(fit_image_size(x, 64, 64)) for x in images[0]]
-    batch = tensors2batch(batch)
-    prediction = _MODEL(batch).argmax(dim=1).tolist()
+    return glyphs.submit(_ENGINE, images[0], _decode)
+
+def _decode(prediction: list[int]) -> str:
     return ''.join(_LABELS[x] for x in prediction)
 
 def _find(hsv_image: NDArray) -> Sequence[NDArray]:
@@ -36,15 +41,14 @@ def _find(hsv_image: NDArray) -> Sequence[NDArray]:
     return find_contours(mask)
 
 def _filter(
-        bgr_image: NDArray,
-        contours: Sequence[NDArray]) -> list[list[NDArray]]:
+        frame: Frame, contours: Sequence[NDArray]) -> list[list[NDArray]]:
     result = []
     for contour in contours:
         if cv2.contourArea(contour) < _THRESH_BORDER_AREA:
             continue
 
         bbox = cv2.boundingRect(contour)
-        gray = bgr2gray(crop_image(bgr_image, bbox))
+        gray = bgr2gray(crop_image(frame, bbox))
         _, blobs = cv2.threshold(
             gray, _THRESH_BLOB_COLOR, 255, cv2.THRESH_BINARY_INV)
         result += _filter_blobs(blobs)
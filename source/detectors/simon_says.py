@@ -1,8 +1,9 @@
 import enum
+from typing import Sequence
 
 import cv2
 from numpy.typing import NDArray
-from utils import crop_image
+from scratch import ScratchArena
 
 
 class SimonSaysColor(enum.IntEnum):
@@ -17,6 +18,7 @@ _CR_SOLVED = ((0, 0, 200), (179, 255, 255))
 
 _THRESH_BRIGHTNESS = 200
 _THRESH_SOLVED = 200
+_SCRATCH = ScratchArena()
 
 _BBOX_SOLVED = (244, 10, 32, 32)
 _BBOX_SQUARES = {
@@ -26,13 +28,22 @@ _BBOX_SQUARES = {
     SimonSaysColor.YELLOW: (200, 129, 16, 16),
 }
 
-def detect_simon_says(hsv_image: NDArray) -> tuple[SimonSaysColor, bool]:
-    mask = cv2.inRange(crop_image(hsv_image, _BBOX_SOLVED), *_CR_SOLVED)
+# Module relative regions expected by detect_simon_says, in order.
+PATCH_BBOXES = (_BBOX_SOLVED, *_BBOX_SQUARES.values())
+
+def detect_simon_says(
+        hsv_patches: Sequence[NDArray]) -> tuple[SimonSaysColor, bool]:
+    solved_patch, *square_patches = hsv_patches
+    mask = cv2.inRange(
+        solved_patch, *_CR_SOLVED,
+        dst=_SCRATCH.get('mask', solved_patch.shape[:2]))
     if cv2.countNonZero(mask) > _THRESH_SOLVED:
         return SimonSaysColor.NONE, True
     
-    for color, bbox in _BBOX_SQUARES.items():
-        mask = cv2.inRange(crop_image(hsv_image, bbox), *_CR_BRIGHTNESS)
+    for color, hsv_patch in zip(_BBOX_SQUARES, square_patches):
+        mask = cv2.inRange(
+            hsv_patch, *_CR_BRIGHTNESS,
+            dst=_SCRATCH.get('mask', hsv_patch.shape[:2]))
         if cv2.countNonZero(mask) > _THRESH_BRIGHTNESS:
             return color, False
         
@@ -1,37 +1,158 @@
+from typing import Optional, Sequence
+
 import cv2
+import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
-from utils import (crop_image, filter_contours_by_area, find_contours,
-                   get_centroid)
+from scratch import ScratchArena
+from utils import Blobs, bgr2hsv, crop_image, find_blobs
 
 _CR_TIMER = ((0, 72, 137), (4, 255, 255))
 _CR_OCCLUDED = ((170, 24, 115), (179, 133, 255))
 _THRESH_BAR_AREA = 100
+_THRESH_BAR_ASPECT = 2
+_THRESH_EDGE_ROW = 20
+_SCRATCH = ScratchArena()
+
+# Bars of one display are closer than this, displays are further apart.
+_GROUP_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (81, 41))
+_PAD_TIMER = 4
+_DIGIT_GAP = 15
+
+# Segments a to g as bits 0 to 6, a is the top bar and g the middle one,
+# b and c are on the right, e and f on the left. Sampled at (x, y) with
+# x in half widths from the digit center and y one of the top, upper,
+# middle, lower and bottom rows.
+_SEGMENTS = (
+    0b0111111, 0b0000110, 0b1011011, 0b1001111, 0b1100110,
+    0b1101101, 0b1111101, 0b0000111, 0b1111111, 0b1101111)
+_SEGMENT_POINTS = (
+    (0, 0), (1, 1), (1, 3), (0, 4), (-1, 3), (-1, 1), (0, 2))
+_DIGIT_LOOKUP = np.full(128, -1, dtype=np.int8)
+_DIGIT_LOOKUP[list(_SEGMENTS)] = range(10)
+_SEGMENT_BITS = 1 << np.arange(7)
 
 _Point = tuple[float, float]
 
+
+class TimerReader:
+    # Reads the timer at bbox of a view by sampling the middle of each
+    # segment. The sample points are learned from the first region the
+    # contour reader decodes, which the samples must reproduce. Until then
+    # and whenever the samples do not spell four digits, the contour
+    # reader is used.
+    def __init__(self, bbox: Sequence[int]) -> None:
+        self._bbox = tuple(bbox)
+        self._xs: Optional[NDArray] = None
+        self._ys: Optional[NDArray] = None
+
+    @property
+    def bbox(self) -> tuple[int, int, int, int]:
+        return self._bbox
+
+    @property
+    def is_sampled(self) -> bool:
+        return self._xs is not None
+
+    def read(self, image: NDArray) -> list[int]:
+        # Image is the bbox region of the view.
+        if self._xs is not None:
+            digits = self._read_samples(image, self._xs, self._ys)
+            if digits is not None:
+                return digits
+
+        hsv_image = bgr2hsv(image, dst=_SCRATCH.get('hsv', image.shape))
+        bars, bbox = _find_bars(hsv_image)
+        digits = _read_bars(bars, bbox[3])
+        if self._xs is None:
+            points = _sample_points(bars, bbox, digits, image.shape)
+            if points is not None and \
+                    self._read_samples(image, *points) == digits:
+                self._xs, self._ys = points
+        return digits
+
+    @staticmethod
+    def _read_samples(
+            image: NDArray, xs: NDArray, ys: NDArray) -> Optional[list[int]]:
+        hsv = cv2.cvtColor(image[ys, xs][:, None], cv2.COLOR_BGR2HSV)
+        lit = cv2.inRange(hsv, *_CR_TIMER) | cv2.inRange(hsv, *_CR_OCCLUDED)
+        codes = (lit.reshape(4, 7) > 0) @ _SEGMENT_BITS
+        digits = _DIGIT_LOOKUP[codes]
+        if (digits < 0).any():
+            return None
+        return digits.tolist()
+
+def locate_timer(view: NDArray | Frame) -> Optional[TimerReader]:
+    # Groups bar shaped blobs of the timer colors into displays, the timer
+    # is the largest display that the contour reader decodes.
+    image = view.image if isinstance(view, Frame) else view
+    mask = _timer_mask(bgr2hsv(view))
+    blobs = find_blobs(mask)
+    blobs = blobs[(blobs.area >= _THRESH_BAR_AREA) & (
+        np.maximum(blobs.width, blobs.height)
+        >= _THRESH_BAR_ASPECT * np.minimum(blobs.width, blobs.height))]
+    if not len(blobs):
+        return None
+
+    bars = np.zeros_like(mask)
+    for i in range(len(blobs)):
+        x, y, w, h = blobs.bbox(i)
+        bars[y:y+h, x:x+w] = 255
+    groups = find_blobs(cv2.dilate(bars, _GROUP_KERNEL))
+    for i in np.argsort(-groups.area, kind='stable'):
+        x, y, w, h = groups.bbox(i)
+        # The bars of a leading or trailing 1 are narrower than its digit,
+        # half the height covers the rest.
+        inside = (blobs.x >= x) & (blobs.y >= y) \
+            & (blobs.right < x + w) & (blobs.bottom < y + h)
+        y0 = max(blobs.y[inside].min() - _PAD_TIMER, 0)
+        y1 = min(blobs.bottom[inside].max() + _PAD_TIMER + 1, mask.shape[0])
+        pad = _PAD_TIMER + (y1 - y0) // 2
+        x0 = max(blobs.x[inside].min() - pad, 0)
+        x1 = min(blobs.right[inside].max() + pad + 1, mask.shape[1])
+        bbox = (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+        try:
+            reader = TimerReader(bbox)
+            reader.read(crop_image(image, bbox))
+        except IndexError:
+            continue
+        return reader
+    return None
+
 def detect_timer(hsv_image: NDArray) -> list[int]:
-    mask = cv2.inRange(hsv_image, *_CR_TIMER)
-    mask |= cv2.inRange(hsv_image, *_CR_OCCLUDED)
-
-    mask = crop_image(mask, cv2.boundingRect(mask))
-    contours = filter_contours_by_area(find_contours(mask), _THRESH_BAR_AREA)
-    contours.sort(key=lambda c: c[:,:,0].min())
-
-    p_horz, p_vert = [], []
-    for point in contours:
-        _, _, w, h = cv2.boundingRect(point)
-        (p_horz if w > h else p_vert).append(get_centroid(point))
-
-    p_htop, p_hmid, p_hbot = [], [], []
-    for point in p_horz:
-        if point[1] >= mask.shape[0]-20:
-            p_hbot.append(point)
-        else:
-            (p_htop if point[1] < 20 else p_hmid).append(point)
-    
-    p_vtop, p_vbot = [], []
-    for point in p_vert:
-        (p_vtop if point[1] < mask.shape[0]/2 else p_vbot).append(point)
+    bars, bbox = _find_bars(hsv_image)
+    return _read_bars(bars, bbox[3])
+
+def _timer_mask(hsv_image: NDArray) -> NDArray:
+    shape = hsv_image.shape[:2]
+    mask = cv2.inRange(
+        hsv_image, *_CR_TIMER, dst=_SCRATCH.get('timer', shape))
+    occluded = cv2.inRange(
+        hsv_image, *_CR_OCCLUDED, dst=_SCRATCH.get('occluded', shape))
+    return cv2.bitwise_or(mask, occluded, dst=mask)
+
+def _find_bars(hsv_image: NDArray) -> tuple[Blobs, tuple[int, int, int, int]]:
+    # Bars sorted by x, relative to the bounding box of the lit pixels.
+    mask = _timer_mask(hsv_image)
+    bbox = cv2.boundingRect(mask)
+    blobs = find_blobs(crop_image(mask, bbox))
+    blobs = blobs[blobs.area >= _THRESH_BAR_AREA]
+    return blobs[np.argsort(blobs.x, kind='stable')], bbox
+
+def _read_bars(blobs: Blobs, height: int) -> list[int]:
+    is_horz = blobs.width > blobs.height
+    p_horz = blobs.centroids[is_horz]
+    p_vert = blobs.centroids[~is_horz]
+
+    is_hbot = p_horz[:, 1] >= height-_THRESH_EDGE_ROW
+    is_htop = ~is_hbot & (p_horz[:, 1] < _THRESH_EDGE_ROW)
+    p_hbot = p_horz[is_hbot].tolist()
+    p_htop = p_horz[is_htop].tolist()
+    p_hmid = p_horz[~is_hbot & ~is_htop].tolist()
+
+    is_vtop = p_vert[:, 1] < height/2
+    p_vtop = p_vert[is_vtop].tolist()
+    p_vbot = p_vert[~is_vtop].tolist()
     
     result = []
     for i in range(4):
@@ -41,6 +162,51 @@ def detect_timer(hsv_image: NDArray) -> list[int]:
             _detect_digit(p_htop, p_hmid, p_hbot, p_vtop, p_vbot))
     return result[::-1]
 
+def _sample_points(
+        blobs: Blobs, bbox: Sequence[int], digits: Sequence[int],
+        shape: Sequence[int]) -> Optional[tuple[NDArray, NDArray]]:
+    # Digit centers from the horizontal bars, which every digit but 1 has,
+    # half widths and rows from all bars. Colon dots are not bar shaped.
+    # Centers of 1s follow from the others, digits are evenly spaced with
+    # the colon between the second and third.
+    height = bbox[3]
+    is_bar = np.maximum(blobs.width, blobs.height) \
+        >= _THRESH_BAR_ASPECT * np.minimum(blobs.width, blobs.height)
+    is_horz = is_bar & (blobs.width > blobs.height)
+    is_vert = is_bar & ~is_horz
+    horz = blobs.centroids[is_horz]
+    vert = blobs.centroids[is_vert]
+
+    x = np.sort(horz[:, 0])
+    groups = np.split(x, np.flatnonzero(np.diff(x) > _DIGIT_GAP) + 1)
+    known = np.flatnonzero(np.array(digits) != 1)
+    if len(groups) != len(known) or len(known) < 3 or not len(vert):
+        return None
+    k = np.arange(4)
+    design = np.stack([np.ones(4), k, k >= 2], axis=1)
+    centers = design @ np.linalg.lstsq(
+        design[known], [x.mean() for x in groups], rcond=None)[0]
+    centers[known] = [x.mean() for x in groups]
+    half_width = np.median(
+        np.abs(vert[:, :1] - centers).min(axis=1))
+
+    y = horz[:, 1]
+    rows = [y[y < _THRESH_EDGE_ROW], vert[vert[:, 1] < height/2, 1],
+            y[(y >= _THRESH_EDGE_ROW) & (y < height-_THRESH_EDGE_ROW)],
+            vert[vert[:, 1] >= height/2, 1], y[y >= height-_THRESH_EDGE_ROW]]
+    if any(not len(x) for x in rows):
+        return None
+    rows = np.array([np.median(x) for x in rows])
+
+    offsets = np.array(_SEGMENT_POINTS)
+    xs = centers[:, None] + offsets[None, :, 0] * half_width
+    ys = np.broadcast_to(rows[offsets[:, 1]], xs.shape)
+    xs = np.round(xs).astype(int).ravel() + bbox[0]
+    ys = np.round(ys).astype(int).ravel() + bbox[1]
+    if xs.min() < 0 or ys.min() < 0 or xs.max() >= shape[1] \
+            or ys.max() >= shape[0]:
+        return None
+    return xs, ys
 
 def _detect_digit(
         p_htop: list[_Point], p_hmid: list[_Point], p_hbot: list[_Point],
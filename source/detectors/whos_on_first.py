@@ -2,20 +2,20 @@ from itertools import chain
 
 import cv2
 import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
 from utils import bgr2gray, crop_image, draw_contour_mask, find_contours
 
 _CR_TOP_WORD_BG = ((88, 41, 80), (111, 110, 126))
 _CR_BUTTON_BG = ((0, 0, 135), (24, 126, 255))
 
-def detect_whos_on_first(bgr_image: NDArray, hsv_image: NDArray) -> list[str]:
-    result = [_extract_top_word(bgr_image, hsv_image)]
-    result += _extract_buttons(hsv_image)
+def detect_whos_on_first(frame: Frame) -> list[str]:
+    result = [_extract_top_word(frame)]
+    result += _extract_buttons(frame.hsv)
     return result
 
-def _extract_top_word(
-        bgr_image: NDArray, hsv_image: NDArray) -> NDArray:
-    mask = cv2.inRange(hsv_image, *_CR_TOP_WORD_BG)
+def _extract_top_word(frame: Frame) -> NDArray:
+    mask = cv2.inRange(frame.hsv, *_CR_TOP_WORD_BG)
     interests = None
     for contour in find_contours(mask):
         bbox = cv2.boundingRect(contour)
@@ -24,7 +24,7 @@ def _extract_top_word(
             break
 
     mask = crop_image(mask, bbox)
-    result = bgr2gray(crop_image(bgr_image, bbox))
+    result = bgr2gray(crop_image(frame, bbox))
     hull = cv2.convexHull(interests)
     mask = draw_contour_mask(
         np.zeros_like(mask), hull, offset=(-bbox[0], -bbox[1]))
@@ -1,7 +1,8 @@
 import enum
 
-import cv2
+from frame import Frame
 from numpy.typing import NDArray
+from segmentation import ColorSegmenter
 from utils import filter_contours_by_area, find_contours, get_centroid
 
 
@@ -26,16 +27,16 @@ COLORS = {
     _WireColor.YELLOW: _CR_YELLOW_WIRE,
     _WireColor.WHITE: _CR_WHITE_WIRE,
 }
+_SEGMENTER = ColorSegmenter(COLORS)
 
 def detect_wires(
-        hsv_image: NDArray, return_positions: bool) \
+        frame: Frame, return_positions: bool) \
             -> list[_WireColor] | list[tuple[int, int]]:
     wires = list[list[_WireColor, NDArray]]()
-    mask = None
-    for color_id, color_range in COLORS.items():
-        mask = cv2.inRange(hsv_image, *color_range, dst=mask)
+    segmentation = _SEGMENTER.segment(frame)
+    for color_id in COLORS:
         contours = filter_contours_by_area(
-            find_contours(mask), _THRESH_CONTOUR_AREA)
+            find_contours(segmentation[color_id]), _THRESH_CONTOUR_AREA)
         for c in contours:
             wires.append([color_id, c])
 
@@ -0,0 +1,108 @@
+import typing
+from typing import Callable, Optional, Sequence
+
+import cv2
+from numpy.typing import NDArray
+
+if typing.TYPE_CHECKING:
+    from screen_capture import FrameInfo
+    from segmentation import ColorSegmenter
+
+
+class Frame:
+    def __init__(
+            self, image: NDArray, info: Optional['FrameInfo'] = None,
+            is_valid: Optional[Callable[[], bool]] = None) -> None:
+        self._image = image
+        self._info = info
+        self._is_valid = is_valid
+        self._cache = {}
+        self._parent: Optional['Frame'] = None
+        self._transform: Optional[Callable[[NDArray], NDArray]] = None
+
+    @property
+    def image(self) -> NDArray:
+        return self._image
+
+    @property
+    def info(self) -> Optional['FrameInfo']:
+        return self._info
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._image.shape
+
+    @property
+    def is_valid(self) -> bool:
+        return self._is_valid is None or self._is_valid()
+
+    @property
+    def hsv(self) -> NDArray:
+        return self._derive(
+            'hsv', lambda x: cv2.cvtColor(x, cv2.COLOR_BGR2HSV))
+
+    @property
+    def gray(self) -> NDArray:
+        return self._derive(
+            'gray', lambda x: cv2.cvtColor(x, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def value(self) -> NDArray:
+        # V of HSV is max(B, G, R), no need for a full conversion.
+        if 'hsv' in self._cache:
+            return self._cache['hsv'][:, :, 2]
+        return self._derive('value', lambda x: x.max(axis=2))
+
+    def labels(self, segmenter: 'ColorSegmenter') -> NDArray:
+        return self._derive(f'labels-{id(segmenter)}', segmenter.label)
+
+    def region(self, bbox: Sequence[int]) -> 'Frame':
+        x, y, w, h = bbox
+        return self._child(
+            ('region', x, y, w, h), lambda image: image[y:y+h, x:x+w])
+
+    def rotate(self, code: int) -> 'Frame':
+        return self._child(
+            ('rotate', code), lambda image: cv2.rotate(image, code))
+
+    def crop(self, bbox: Sequence[int]) -> NDArray:
+        return self.region(bbox).image
+
+    def snapshot(self) -> 'Frame':
+        if self._is_valid is None:
+            return self
+        result = self._image.copy()
+        self._check()
+        return Frame(result, self._info)
+
+    def _child(
+            self, key: tuple,
+            transform: Callable[[NDArray], NDArray]) -> 'Frame':
+        if key not in self._cache:
+            image = transform(self._image)
+            if self._is_valid is not None:
+                if image.base is not None:
+                    image = image.copy()
+                self._check()
+            child = Frame(image, self._info)
+            child._parent = self
+            child._transform = transform
+            self._cache[key] = child
+        return self._cache[key]
+
+    def _derive(self, name: str, convert: Callable[[NDArray], NDArray]) \
+            -> NDArray:
+        if name not in self._cache:
+            parent = self._parent
+            if parent is not None and name in parent._cache:
+                result = self._transform(parent._cache[name])
+            else:
+                result = convert(self._image)
+                if self._is_valid is not None:
+                    self._check()
+            self._cache[name] = result
+        return self._cache[name]
+
+    def _check(self) -> None:
+        if not self.is_valid:
+            raise RuntimeError('Frame was overwritten by a newer capture')
@@ -1,17 +1,26 @@
-import time
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
 
 import cv2
 from detectors.battery import detect_batteries
-from detectors.bomb_modules import BombModuleType, detect_module_type
-from detectors.indicator import detect_indicators
+from detectors.bomb_modules import BombModuleType, detect_module_types
+from detectors.indicator import request_indicators
 from detectors.parallel_port import detect_parallel_ports
-from detectors.serial import detect_serial
+from detectors.serial import request_serial
 from detectors.side_border import detect_side_border
+from frame import Frame
+from glyphs import GlyphService
+from layout import REFERENCE_SIZE, Layout, calibrate
 from mouse import Mouse
+from replay import Clock
 from screen_capture import ScreenCapture
-from solvers import get_solver
+from solvers import get_solver, prefetch_solvers
 from typing_extensions import Self
 
+_ALLOC_LOGGER = logging.getLogger('alloc')
+
 _BOMB_MODULE_BBOXES = (
     (560, 291, 262, 243),
     (849, 291, 251, 243),
@@ -21,6 +30,11 @@ _BOMB_MODULE_BBOXES = (
     (1133, 558, 266, 262))
 _BOMB_ZOOMED_MODULE_BBOX = (832, 387, 297, 293)
 
+_SIDE_ROTATIONS = {
+    'lft': cv2.ROTATE_90_COUNTERCLOCKWISE,
+    'rgh': cv2.ROTATE_90_CLOCKWISE,
+    'top': cv2.ROTATE_180}
+
 _UI_TIME_ARROWS = ((720, 315), (860, 315))
 _UI_MODULE_ARROWS = ((720, 400), (860, 400))
 _UI_NEEDY_FLIP = (750, 540)
@@ -36,9 +50,15 @@ _UI_MODULE_SPOTS = (
     (1250, 680))
 
 class GameState:
-    def __init__(self) -> None:
-        self._mouse = Mouse()
-        self._screen_capture = ScreenCapture()
+    def __init__(self, mouse=None, screen_capture=None, clock=None) -> None:
+        self._mouse = mouse or Mouse()
+        self._screen_capture = screen_capture or ScreenCapture()
+        self._clock = clock or Clock()
+        # Coordinates below and in the solvers are given for 1920x1080,
+        # the layout maps them to the live resolution. Images are scaled
+        # back to 1920x1080 for the detectors, see layout.py. It is
+        # calibrated in the setup room, see open_free_play.
+        self._layout = Layout(REFERENCE_SIZE, 1, (0, 0))
 
         self._time_limit_ndx = 9 # max=19
         self._module_count_ndx = 0 # max 8
@@ -46,11 +66,11 @@ class GameState:
         self._hardcore_enabled = False
     
     def slp(self, seconds: float = 1/30) -> Self:
-        time.sleep(seconds)
+        self._clock.sleep(seconds)
         return self
     
     def mov(self, x: int, y: int) -> Self:
-        self._mouse.move(x, y)
+        self._mouse.move(*self._layout.point(x, y))
         return self
     
     def ldn(self) -> Self:
@@ -70,15 +90,31 @@ class GameState:
         return self
     
     def grab_screen(self):
-        return self._screen_capture()
+        return self._layout.reference_frame(self._screen_capture())
+    
+    def grab_regions(self, bboxes):
+        images = self._screen_capture.grab_regions(
+            [self._layout.bbox(x) for x in bboxes])
+        return [self._layout.to_reference(x, y) for x, y in zip(images, bboxes)]
     
     def grab_active_module(self):
-        image = self._screen_capture()
-        bbox = _BOMB_ZOOMED_MODULE_BBOX
-        return image[bbox[1]:bbox[1]+bbox[3],
-                     bbox[0]:bbox[0]+bbox[2]]
+        image = self.grab_regions((_BOMB_ZOOMED_MODULE_BBOX,))[0]
+        return Frame(image, self._screen_capture.info)
+    
+    def grab_module_regions(self, bboxes):
+        return self.grab_regions(self._to_screen(bboxes))
+    
+    @contextmanager
+    def stream_module_regions(self, bboxes):
+        self._screen_capture.start_stream(
+            [self._layout.bbox(x) for x in self._to_screen(bboxes)])
+        try:
+            yield self
+        finally:
+            self._screen_capture.stop_stream()
     
     def open_free_play(self) -> None:
+        self._layout = calibrate(self._screen_capture())
         self.mov(500, 570).ldn().lup().slp(0.5)
     
     def set_settings(self,
@@ -101,15 +137,22 @@ class GameState:
             self.mov(*_UI_HARDCORE_FLIP).ldn().lup().slp()
             self._hardcore_enabled = hardcore_enabled
 
-    def start_game(self) -> None:
+    def start_game(self, prefetch: bool = True) -> None:
         self._serial = None
         self._indicators = []
+        self._glyphs = GlyphService()
+        self._serial_request = None
+        self._indicator_requests = []
         self._parallel_port_count = 0
         self._battery_count = 0
         self._front_modules = []
         self._back_modules = []
         self._timer_position = 0
 
+        # Solvers load their models on first use, the load screen gives
+        # time to do that in the background.
+        if prefetch:
+            threading.Thread(target=prefetch_solvers, daemon=True).start()
         self.mov(*_UI_START_BUTTON).ldn().lup().slp(14)
         self._inspect_bomb()
     
@@ -144,6 +187,7 @@ class GameState:
         self.mov(200, 200).slp(1.25)
 
         self._inspect_side('bck')
+        self._read_glyphs()
         
         self._solve(self._back_modules)
 
@@ -155,43 +199,44 @@ class GameState:
         self._solve(self._front_modules)
     
     def _inspect_side(self, side: str) -> None:
-        bgr_screen = self.grab_screen()
         if side in ('bck', 'frn'):
             modules_list = [self._front_modules, self._back_modules]
             modules_list = modules_list[side == 'bck'] 
-            for pos, bbox in enumerate(_BOMB_MODULE_BBOXES):
-                bgr_image = bgr_screen[bbox[1]:bbox[1]+bbox[3],
-                                       bbox[0]:bbox[0]+bbox[2]]
-                module_type = detect_module_type(bgr_image)
+            images = self.grab_regions(_BOMB_MODULE_BBOXES)
+            info = self._screen_capture.info
+            modules = [Frame(x, info) for x in images]
+            module_types = detect_module_types(modules)
+            for pos, (module, module_type) in enumerate(
+                    zip(modules, module_types)):
                 if module_type == BombModuleType.TIMER:
                     self._timer_position = pos
-                modules_list.append(get_solver(module_type, pos, bgr_image))
+                modules_list.append(
+                    get_solver(module_type, pos, module, self._glyphs))
         else:
-            hsv_screen = cv2.cvtColor(bgr_screen, cv2.COLOR_BGR2HSV)
-            x0, y0, x1, y1 = detect_side_border(hsv_screen)
-            bgr_screen = bgr_screen[y0:y1, x0:x1]
-            hsv_screen = hsv_screen[y0:y1, x0:x1]
+            frame = self.grab_screen()
+            x0, y0, x1, y1 = detect_side_border(frame.hsv)
+            frame = frame.region((x0, y0, x1 - x0, y1 - y0))
 
-            self._battery_count += detect_batteries(hsv_screen)
-            self._parallel_port_count += detect_parallel_ports(hsv_screen)
+            self._battery_count += detect_batteries(frame.hsv)
+            self._parallel_port_count += detect_parallel_ports(frame.hsv)
             
-            if side == 'lft':
-                bgr_screen = cv2.rotate(bgr_screen, cv2.ROTATE_90_COUNTERCLOCKWISE)
-                hsv_screen = cv2.rotate(hsv_screen, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            elif side == 'rgh':
-                bgr_screen = cv2.rotate(bgr_screen, cv2.ROTATE_90_CLOCKWISE)
-                hsv_screen = cv2.rotate(hsv_screen, cv2.ROTATE_90_CLOCKWISE)
-            elif side == 'top':
-                bgr_screen = cv2.rotate(bgr_screen, cv2.ROTATE_180)
-                hsv_screen = cv2.rotate(hsv_screen, cv2.ROTATE_180)
+            if side in _SIDE_ROTATIONS:
+                frame = frame.rotate(_SIDE_ROTATIONS[side])
             
-            for indicator in detect_indicators(bgr_screen, hsv_screen):
-                self._indicators.append(indicator)
+            self._indicator_requests.append(
+                request_indicators(frame, self._glyphs))
 
-            if self._serial is None:
-                serial = detect_serial(bgr_screen, hsv_screen)
-                if serial is not None:
-                    self._serial = serial
+            if self._serial_request is None:
+                self._serial_request = request_serial(frame, self._glyphs)
+    
+    def _read_glyphs(self) -> None:
+        # Glyphs from all sides and faces are recognized in one batch per
+        # model once the whole bomb has been inspected.
+        self._glyphs.flush()
+        for request in self._indicator_requests:
+            self._indicators += request.get()
+        if self._serial_request is not None:
+            self._serial = self._serial_request.get()
     
     def _solve(self, module_list):
         for ndx, module in enumerate(module_list):
@@ -199,9 +244,32 @@ class GameState:
                 continue
             self.mov(*_UI_MODULE_SPOTS[ndx]).ldn().lup().slp()
             self.mov(*((1720, 200) if ndx == 5 else (200, 200))).slp(0.75)
-            module.solve(self)
+            self._solve_module(module)
             self.rdn().rup().slp(1)
 
+    def _solve_module(self, module) -> None:
+        if not tracemalloc.is_tracing():
+            module.solve(self)
+            return
+        # Traced memory is relative to the start of the solve, the peak
+        # includes buffers that were freed again. Blocks are the change in
+        # live allocations over the solve.
+        before = _snapshot()
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        module.solve(self)
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(
+            x.count_diff for x in _snapshot().compare_to(before, 'filename'))
+        _ALLOC_LOGGER.info(
+            '%s peak %d bytes retained %d bytes %+d blocks',
+            type(module).__name__, peak - start, current - start, blocks)
+
+    @staticmethod
+    def _to_screen(bboxes):
+        x0, y0 = _BOMB_ZOOMED_MODULE_BBOX[:2]
+        return [(x0+x, y0+y, w, h) for x, y, w, h in bboxes]
+
     def _change_range_setting(self,
                               arrows: tuple[tuple[int, int]],
                               current_value: int,
@@ -232,3 +300,16 @@ class GameState:
     @property
     def timer_position(self) -> int:
         return self._timer_position
+
+    @property
+    def frame_time(self) -> int:
+        return self._screen_capture.info.swap_ns
+
+    @property
+    def time_ns(self) -> int:
+        return self._clock.monotonic_ns()
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Leaves out the snapshots themselves.
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
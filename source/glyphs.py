@@ -0,0 +1,50 @@
+from typing import Any, Callable, Optional, Sequence
+
+from inference import InferenceEngine
+from numpy.typing import NDArray
+
+
+class GlyphResult:
+    def __init__(
+            self, service: 'GlyphService',
+            decode: Optional[Callable[[list[int]], Any]]) -> None:
+        self._service = service
+        self._decode = decode
+        self._prediction: Optional[list[int]] = None
+
+    def get(self) -> Any:
+        if self._prediction is None:
+            self._service.flush()
+        if self._decode is None:
+            return self._prediction
+        return self._decode(self._prediction)
+
+class GlyphService:
+    # Glyph crops are collected over a phase and recognized in one batch
+    # per model, either on flush or when the first result is needed.
+    def __init__(self) -> None:
+        self._pending = list[
+            tuple[InferenceEngine, Sequence[NDArray], GlyphResult]]()
+
+    def submit(
+            self, engine: InferenceEngine, images: Sequence[NDArray],
+            decode: Optional[Callable[[list[int]], Any]] = None) \
+                -> GlyphResult:
+        result = GlyphResult(self, decode)
+        if images:
+            self._pending.append((engine, images, result))
+        else:
+            result._prediction = []
+        return result
+
+    def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        engines = list(dict.fromkeys(x[0] for x in pending))
+        for engine in engines:
+            requests = [x for x in pending if x[0] is engine]
+            images = [y for x in requests for y in x[1]]
+            prediction = engine.predict(images)
+            start = 0
+            for _, images, result in requests:
+                result._prediction = prediction[start:start+len(images)]
+                start += len(images)
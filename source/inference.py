@@ -0,0 +1,481 @@
+import hashlib
+import logging
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import cv2
+import torch
+import torch.nn as nn
+from frame import Frame
+from memo import MemoCache, memo_key
+from numpy.typing import NDArray
+from precision import PRECISIONS, reduce_precision, top1
+from prototypes import (GlyphMatcher, PrototypeMatcher, ThumbnailMatcher,
+                        load_prototypes)
+from utils import letterbox_image
+
+_COMPILED_DIR = Path('models/compiled')
+_CROPS_BATCH_SIZE = 32
+# Compiled models are timed on a batch this large, glyphs come in words.
+_COMPILE_GLYPH_BATCH = 6
+_COMPILE_WARMUP = 2
+_COMPILE_RUNS = 5
+_INPUT_FORMAT = 'uint8'
+_LOGGER = logging.getLogger('cascade')
+
+
+class InferenceConfig:
+    # Settings of the engines created with it. The setters reload what they
+    # affect in the engines that are already loaded.
+    def __init__(self) -> None:
+        self.engines: list['InferenceEngine'] = []
+        self.compile = False
+        self.precision = 'fp32'
+        self.crops_dir = Path('crops')
+        self.min_agreement = 0.99
+        self.save_crops_dir: Optional[Path] = None
+        self.memo_capacity = 0
+        self.memo_path: Optional[Path] = None
+        self.memo_saved: dict[str, tuple[str, torch.Tensor, torch.Tensor]] = {}
+        self.prototypes_dir: Optional[Path] = None
+        self.prototype_audit = False
+
+    def load_engines(self) -> None:
+        for engine in self.engines:
+            engine.model
+
+    def set_compiled(self, enabled: bool) -> None:
+        self.compile = enabled
+        self._unload_engines()
+
+    def set_precision(
+            self, precision: str, crops_dir: Path = Path('crops'),
+            min_agreement: float = 0.99) -> None:
+        # Crops for a model are read from crops_dir/<weights name>/**/*.png.
+        if precision not in PRECISIONS:
+            raise ValueError(f'Unknown precision {precision}')
+        self.precision = precision
+        self.crops_dir = Path(crops_dir)
+        self.min_agreement = min_agreement
+        self._unload_engines()
+
+    def set_save_crops(self, crops_dir: Optional[Path]) -> None:
+        self.save_crops_dir = None if crops_dir is None else Path(crops_dir)
+
+    def set_memo_cache(
+            self, capacity: int, path: Optional[Path] = None) -> None:
+        # Memoized logits are loaded from and saved to path, entries of
+        # models whose weights or precision changed are dropped.
+        self.memo_capacity = capacity
+        self.memo_path = None if path is None else Path(path)
+        self.memo_saved = {}
+        if self.memo_path is not None and self.memo_path.exists():
+            self.memo_saved = torch.load(self.memo_path)
+        for engine in self.engines:
+            engine.reload_memo()
+
+    def save_memo_cache(self) -> None:
+        if self.memo_path is None:
+            return
+        saved = dict(self.memo_saved)
+        for engine in self.engines:
+            if engine.memo is not None and len(engine.memo):
+                saved[engine.name] = (
+                    engine.memo_tag, *engine.memo.to_tensors())
+        self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save(saved, self.memo_path)
+
+    def set_prototypes(
+            self, prototypes_dir: Optional[Path], audit: bool = False) -> None:
+        # Prototypes for a model are read from prototypes_dir/<weights name>/
+        # <label>/*.png. With audit, the model still runs on every input and
+        # its predictions for matched inputs are logged.
+        self.prototypes_dir = None if prototypes_dir is None \
+            else Path(prototypes_dir)
+        self.prototype_audit = audit
+        for engine in self.engines:
+            engine.reload_prototypes()
+
+    def _unload_engines(self) -> None:
+        for engine in self.engines:
+            engine.unload()
+
+# Engines use this unless they are given their own.
+CONFIG = InferenceConfig()
+
+class InferenceEngine:
+    def __init__(
+            self, factory: Callable[[], nn.Module], path: Path,
+            glyph_size: Optional[tuple[int, int]] = None,
+            input_size: Optional[tuple[int, int]] = None,
+            prototypes: bool = False,
+            config: Optional[InferenceConfig] = None) -> None:
+        # Models with a glyph size take grayscale crops letterboxed to it,
+        # the others take BGR images of about input_size. Single head models
+        # of visually distinctive classes can try a prototype matcher first.
+        self._factory = factory
+        self._path = Path(path)
+        self._glyph_size = glyph_size
+        self._input_size = input_size
+        self._model = None
+        self._eager: Optional[_UInt8Input] = None
+        self._buffer: Optional[torch.Tensor] = None
+        self._lock = threading.Lock()
+        self.precision = 'fp32'
+        self.agreement: Optional[float] = None
+        self.speedup: Optional[float] = None
+        self._calibration_digest: Optional[str] = None
+        self._saved_count = 0
+        self.memo: Optional[MemoCache] = None
+        self._use_prototypes = prototypes
+        self.matcher: Optional[PrototypeMatcher] = None
+        self._config = config or CONFIG
+        self._config.engines.append(self)
+
+    @property
+    def name(self) -> str:
+        return self._path.stem
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def is_compiled(self) -> bool:
+        return isinstance(self.model, torch.jit.ScriptModule)
+
+    @property
+    def model(self) -> nn.Module:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load()
+        return self._model
+
+    def unload(self) -> None:
+        with self._lock:
+            self._model = None
+
+    def reload_memo(self) -> None:
+        with self._lock:
+            if self.is_loaded:
+                self._load_memo()
+
+    def reload_prototypes(self) -> None:
+        with self._lock:
+            if self.is_loaded:
+                self._load_prototypes()
+
+    @property
+    def memo_tag(self) -> str:
+        return f'{self._weights_digest()}-{self.precision}'
+
+    def logits(
+            self, images: Sequence[NDArray | Frame]) \
+                -> torch.Tensor | tuple[torch.Tensor, ...]:
+        model = self.model
+        with self._lock, torch.inference_mode():
+            batch = self._to_batch(images)
+            logits = self._infer(model, batch)
+            if self._config.save_crops_dir is not None:
+                self._save_crops(images, logits)
+            return logits
+
+    def probabilities(
+            self, images: Sequence[NDArray | Frame]) \
+                -> torch.Tensor | tuple[torch.Tensor, ...]:
+        logits = self.logits(images)
+        if isinstance(logits, torch.Tensor):
+            return logits.softmax(dim=1)
+        return tuple(x.softmax(dim=1) for x in logits)
+
+    def predict(
+            self, images: Sequence[NDArray | Frame]) \
+                -> list[int] | list[list[int]]:
+        model = self.model
+        if self.matcher is not None and self._config.save_crops_dir is None:
+            images = [x.image if isinstance(x, Frame) else x for x in images]
+            with self._lock, torch.inference_mode():
+                matched = self.matcher.match(images)
+                # Auditing runs the model on the matched images as well.
+                missing = [i for i, x in enumerate(matched)
+                           if x is None or self._config.prototype_audit]
+                result = list(matched)
+                if missing:
+                    batch = self._to_batch([images[i] for i in missing])
+                    logits = self._infer(model, batch)
+                    for i, x in zip(missing, logits.argmax(dim=1).tolist()):
+                        result[i] = x
+                        if matched[i] is not None:
+                            _LOGGER.info(
+                                '%s audit %d model %d', self.name,
+                                matched[i], x)
+                return result
+
+        logits = self.logits(images)
+        if isinstance(logits, torch.Tensor):
+            return logits.argmax(dim=1).tolist()
+        return [x.argmax(dim=1).tolist() for x in logits]
+
+    def _infer(
+            self, model: nn.Module, batch: torch.Tensor) \
+                -> torch.Tensor | tuple[torch.Tensor, ...]:
+        if self.memo is None:
+            return self._run(model, batch)
+        return self._run_memoized(model, batch)
+
+    def _run(
+            self, model: nn.Module, batch: torch.Tensor) \
+                -> torch.Tensor | tuple[torch.Tensor, ...]:
+        if model is self._eager:
+            return model(batch)
+        try:
+            return _to_float(model(batch))
+        except RuntimeError as e:
+            self._fall_back(e)
+            return self._eager(batch)
+
+    def _run_memoized(
+            self, model: nn.Module, batch: torch.Tensor) -> torch.Tensor:
+        keys = [memo_key(x) for x in batch.numpy()]
+        rows = [self.memo.get(x) for x in keys]
+        missing = [i for i, x in enumerate(rows) if x is None]
+        if missing:
+            for i, row in zip(missing, self._run(model, batch[missing])):
+                rows[i] = row
+                self.memo.put(keys[i], row)
+        return torch.stack(rows)
+
+    def _load(self) -> None:
+        model = self._factory().eval()
+        model.load_state_dict(torch.load(self._path, map_location='cpu'))
+        _fold_input_scale(model)
+        self._eager = _UInt8Input(model, torch.float32).eval()
+        self._model = self._eager
+        self.precision = 'fp32'
+        self.agreement = None
+        self.speedup = None
+        self._calibration_digest = None
+        if self._config.precision != 'fp32':
+            self._load_reduced()
+        if self._config.compile:
+            try:
+                self._load_compiled()
+            except Exception as e:
+                warnings.warn(f'Running {self.name} uncompiled: {e}')
+        self._load_memo()
+        self._load_prototypes()
+
+    def _load_memo(self) -> None:
+        # Only glyph models are memoized, their inputs are binary crops that
+        # repeat across stages and games.
+        self.memo = None
+        if not self._config.memo_capacity or self._glyph_size is None:
+            return
+        self.memo = MemoCache(self._config.memo_capacity)
+        saved = self._config.memo_saved.get(self.name)
+        if saved is not None:
+            tag, keys, logits = saved
+            if tag == self.memo_tag:
+                self.memo.update(keys, logits)
+
+    def _load_prototypes(self) -> None:
+        self.matcher = None
+        prototypes_dir = self._config.prototypes_dir
+        if prototypes_dir is None or not self._use_prototypes:
+            return
+        self.matcher = load_prototypes(
+            prototypes_dir / self.name,
+            ThumbnailMatcher if self._glyph_size is None else GlyphMatcher)
+
+    def _weights_digest(self) -> str:
+        digest = hashlib.sha256(self._path.read_bytes())
+        digest.update(_INPUT_FORMAT.encode())
+        return digest.hexdigest()[:16]
+
+    def _load_reduced(self) -> None:
+        # A reduced precision model is only used if its predictions agree
+        # with fp32 on the recorded crops of this model.
+        precision = self._config.precision
+        batches = self._crop_batches()
+        if not batches:
+            warnings.warn(f'No crops to check {precision} {self.name}')
+            return
+
+        calibration = batches[::2]
+        try:
+            model, dtype = reduce_precision(
+                self._eager.model, precision, [x.float() for x in calibration])
+            model = _UInt8Input(model, dtype).eval()
+            with torch.inference_mode():
+                expected = torch.cat([top1(self._eager(x)) for x in batches])
+                actual = torch.cat([top1(_to_float(model(x))) for x in batches])
+        except Exception as e:
+            warnings.warn(f'Cannot run {self.name} in {precision}: {e}')
+            return
+
+        self.agreement = (expected == actual).float().mean().item()
+        if self.agreement < self._config.min_agreement:
+            warnings.warn(
+                f'{self.name} in {precision} agrees with fp32 on '
+                f'{self.agreement:.1%} of crops, keeping fp32')
+            return
+        self._model = model
+        self.precision = precision
+        if precision == 'int8-static':
+            digest = hashlib.sha256()
+            for batch in calibration:
+                digest.update(batch.numpy().tobytes())
+            self._calibration_digest = digest.hexdigest()[:16]
+
+    def _save_crops(
+            self, images: Sequence[NDArray | Frame],
+            logits: torch.Tensor | tuple[torch.Tensor, ...]) -> None:
+        # Crops are filed under the predicted class of the first head, so
+        # wrong predictions can be fixed by moving the file.
+        if not isinstance(logits, torch.Tensor):
+            logits = logits[0]
+        for image, label in zip(images, logits.argmax(dim=1).tolist()):
+            if isinstance(image, Frame):
+                image = image.image
+            path = self._config.save_crops_dir / self.name / str(label)
+            path.mkdir(parents=True, exist_ok=True)
+            cv2.imwrite(str(path / f'{self._saved_count:06d}.png'), image)
+            self._saved_count += 1
+
+    def _crop_batches(self) -> list[torch.Tensor]:
+        flags = cv2.IMREAD_COLOR if self._glyph_size is None \
+            else cv2.IMREAD_GRAYSCALE
+        paths = sorted((self._config.crops_dir / self.name).rglob('*.png'))
+        batches = []
+        for i in range(0, len(paths), _CROPS_BATCH_SIZE):
+            images = [cv2.imread(str(x), flags)
+                      for x in paths[i:i+_CROPS_BATCH_SIZE]]
+            batches.append(self._to_batch(images).clone())
+        return batches
+
+    def _load_compiled(self) -> None:
+        # Compiled modules depend on the torch build, the input format, the
+        # traced shape and the calibration crops of statically quantized
+        # models, so these are hashed too. Optimized graphs hold
+        # prepacked weights that cannot be saved, so the frozen module is
+        # cached and optimized after loading.
+        example = self._example_batch()
+        digest = hashlib.sha256(self._weights_digest().encode())
+        digest.update(torch.__version__.encode())
+        digest.update(self.precision.encode())
+        digest.update(str(tuple(example.shape)).encode())
+        if self._calibration_digest is not None:
+            digest.update(self._calibration_digest.encode())
+        path = _COMPILED_DIR / f'{self.name}-{digest.hexdigest()[:16]}.pt'
+        if path.exists():
+            model = torch.jit.load(path)
+        else:
+            with torch.no_grad(), warnings.catch_warnings():
+                # Tracing is deprecated in recent torch releases but works.
+                warnings.simplefilter('ignore', FutureWarning)
+                traced = torch.jit.trace(self._model, example, strict=False)
+                model = torch.jit.freeze(traced)
+            _COMPILED_DIR.mkdir(parents=True, exist_ok=True)
+            torch.jit.save(model, path)
+        model = torch.jit.optimize_for_inference(model)
+
+        # Compiling slows some models down, it is kept where it pays off.
+        self.speedup = _best_time(self._model, example) \
+            / _best_time(model, example)
+        if self.speedup < 1:
+            warnings.warn(
+                f'Running {self.name} uncompiled, compiled it runs at '
+                f'{self.speedup:.2f}x')
+            return
+        self._model = model
+
+    def _example_batch(self) -> torch.Tensor:
+        # A batch of the size and shape the model sees in a game.
+        if self._glyph_size is not None:
+            (width, height), channels = self._glyph_size, 1
+            count = _COMPILE_GLYPH_BATCH
+        else:
+            (width, height), channels, count = self._input_size, 3, 1
+        return torch.randint(
+            0, 256, (count, height, width, channels), dtype=torch.uint8) \
+            .permute(0, 3, 1, 2)
+
+    def _fall_back(self, error: Exception) -> None:
+        warnings.warn(f'Running {self.name} in eager fp32 mode: {error}')
+        self._model = self._eager
+        self.precision = 'fp32'
+
+    def _to_batch(self, images: Sequence[NDArray | Frame]) -> torch.Tensor:
+        images = [x.image if isinstance(x, Frame) else x for x in images]
+        if self._glyph_size is not None:
+            width, height = self._glyph_size
+            # Glyphs are letterboxed straight into their zeroed slot.
+            batch = self._get_buffer((len(images), height, width, 1))
+            batch.zero_()
+            for dst, image in zip(batch.numpy(), images):
+                letterbox_image(image, dst[:, :, 0])
+        else:
+            # BGR crops may differ by a few pixels. Smaller ones are centered
+            # in the largest one unscaled, their edges repeated around them.
+            # That shifts the instance norm statistics the least, zero
+            # padding or stretching change more predictions.
+            height = max(x.shape[0] for x in images)
+            width = max(x.shape[1] for x in images)
+            batch = self._get_buffer((len(images), height, width, 3))
+            for dst, image in zip(batch.numpy(), images):
+                top = (height - image.shape[0]) // 2
+                left = (width - image.shape[1]) // 2
+                cv2.copyMakeBorder(
+                    image, top, height - image.shape[0] - top, left,
+                    width - image.shape[1] - left, cv2.BORDER_REPLICATE,
+                    dst=dst)
+        return batch.permute(0, 3, 1, 2)
+
+    def _get_buffer(self, shape: tuple[int, ...]) -> torch.Tensor:
+        # The buffer is kept in NHWC, so the NCHW view handed to the model is
+        # channels last.
+        if self._buffer is None or self._buffer.shape[1:] != shape[1:] \
+                or len(self._buffer) < shape[0]:
+            self._buffer = torch.empty(shape, dtype=torch.uint8)
+        return self._buffer[:shape[0]]
+
+class _UInt8Input(nn.Module):
+    # Models are fed uint8 pixels, the 1/255 scaling lives in the weights
+    # of their first convolution.
+    def __init__(self, model: nn.Module, dtype: torch.dtype) -> None:
+        super().__init__()
+        self.model = model
+        self.dtype = dtype
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x.to(self.dtype))
+
+def set_num_threads(count: int) -> None:
+    torch.set_num_threads(count)
+
+def _best_time(model: nn.Module, batch: torch.Tensor) -> float:
+    with torch.inference_mode():
+        for _ in range(_COMPILE_WARMUP):
+            model(batch)
+        times = []
+        for _ in range(_COMPILE_RUNS):
+            start = time.perf_counter()
+            model(batch)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+def _fold_input_scale(model: nn.Module) -> None:
+    conv = next(x for x in model.modules() if isinstance(x, nn.Conv2d))
+    with torch.no_grad():
+        conv.weight.mul_(1/255)
+
+def _to_float(
+        logits: torch.Tensor | Sequence[torch.Tensor]) \
+            -> torch.Tensor | tuple[torch.Tensor, ...]:
+    if isinstance(logits, torch.Tensor):
+        return logits.float()
+    return tuple(x.float() for x in logits)
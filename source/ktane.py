@@ -1,13 +1,117 @@
+import argparse
+import logging
+import tracemalloc
+
 from game_state import GameState
+from inference import CONFIG, set_num_threads
+from precision import PRECISIONS
+from mouse import Mouse
+from replay import (Clock, Recording, RecordingMouse, RecordingScreenCapture,
+                    ReplayScreenCapture, VirtualClock, compare_mouse,
+                    first_timestamp)
+from screen_capture import RecordedScreenCapture, ScreenCapture
 
 
 def main():
-    state = GameState()
-    state.slp(2)
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='DIR',
+                       help='store captured frames and mouse actions')
+    group.add_argument('--replay', metavar='DIR',
+                       help='run against a recording on a virtual clock')
+    parser.add_argument('--record-frames', metavar='FILE',
+                        help='continuously record every frame grabbed')
+    parser.add_argument('--threads', type=int,
+                        help='number of threads used for inference')
+    parser.add_argument('--compile', action='store_true',
+                        help='run models as frozen TorchScript modules')
+    parser.add_argument('--precision', choices=PRECISIONS, default='fp32',
+                        help='reduced precision mode for inference')
+    parser.add_argument('--crops', metavar='DIR', default='crops',
+                        help='crops that gate the reduced precision mode')
+    parser.add_argument('--min-agreement', type=float, default=0.99,
+                        help='required top-1 agreement with fp32')
+    parser.add_argument('--save-crops', metavar='DIR',
+                        help='store every model input under its prediction')
+    parser.add_argument('--memo-cache', type=int, default=0, metavar='N',
+                        help='memoize the last N results of each glyph model')
+    parser.add_argument('--memo-file', metavar='FILE',
+                        help='keep the memoized results across games')
+    parser.add_argument('--prototypes', metavar='DIR',
+                        help='match glyphs and module slots against labelled '
+                             'crops before running their model')
+    parser.add_argument('--cascade-log', metavar='FILE',
+                        help='log every prototype match decision')
+    parser.add_argument('--cascade-audit', action='store_true',
+                        help='run the models on matched crops too and log '
+                             'their predictions')
+    parser.add_argument('--alloc-log', metavar='FILE',
+                        help='trace memory allocations and log them per '
+                             'solved module')
+    args = parser.parse_args()
+
+    if args.threads:
+        set_num_threads(args.threads)
+    if args.compile:
+        CONFIG.set_compiled(True)
+    if args.precision != 'fp32':
+        CONFIG.set_precision(args.precision, args.crops, args.min_agreement)
+    if args.save_crops:
+        CONFIG.set_save_crops(args.save_crops)
+    if args.prototypes:
+        CONFIG.set_prototypes(args.prototypes, args.cascade_audit)
+    if args.cascade_log:
+        logger = logging.getLogger('cascade')
+        logger.addHandler(logging.FileHandler(args.cascade_log))
+        logger.setLevel(logging.DEBUG)
+    if args.alloc_log:
+        logger = logging.getLogger('alloc')
+        logger.addHandler(logging.FileHandler(args.alloc_log))
+        logger.setLevel(logging.INFO)
+        tracemalloc.start()
+    if args.memo_cache:
+        CONFIG.set_memo_cache(args.memo_cache, args.memo_file)
+
+    screen_capture = None
+    if not args.replay:
+        screen_capture = ScreenCapture()
+        if args.record_frames:
+            screen_capture = RecordedScreenCapture(
+                screen_capture, args.record_frames)
+
+    recording = None
+    if args.record:
+        clock = Clock()
+        recording = Recording(args.record, clock)
+        state = GameState(
+            RecordingMouse(recording, Mouse()),
+            RecordingScreenCapture(recording, screen_capture),
+            clock)
+    elif args.replay:
+        clock = VirtualClock(first_timestamp(args.replay))
+        recording = Recording(f'{args.replay}/replay', clock)
+        state = GameState(
+            RecordingMouse(recording),
+            ReplayScreenCapture(args.replay, clock),
+            clock)
+    else:
+        state = GameState(screen_capture=screen_capture)
+
+    try:
+        state.slp(2)
+
+        state.open_free_play()
+        state.set_settings(19, 9, False, False)
+        state.start_game()
+    finally:
+        CONFIG.save_memo_cache()
+        if recording is not None:
+            recording.close()
+        if args.replay:
+            print(compare_mouse(args.replay, f'{args.replay}/replay')
+                  or 'Replayed mouse actions match the recording')
+        if isinstance(screen_capture, RecordedScreenCapture):
+            screen_capture.close()
 
-    state.open_free_play()
-    state.set_settings(19, 9, False, False)
-    state.start_game()
-     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,149 @@
+import json
+import logging
+from pathlib import Path
+from typing import Sequence
+
+import cv2
+import numpy as np
+from frame import Frame
+from numpy.typing import NDArray
+from utils import bgr2gray
+
+# All screen geometry in the bot is given for this resolution. The
+# detectors and models are tuned for it too, so captures are scaled back
+# to it before they run. A lower resolution only shrinks the readback,
+# vision costs the same as at 1920x1080 plus the resize: about 0.2 ms
+# per module region, 20 ms for a full frame, which only the side
+# inspections and locating the timer grab.
+REFERENCE_SIZE = (1920, 1080)
+
+_LOGGER = logging.getLogger('layout')
+
+_CACHE_DIR = Path('calibration')
+_THRESH_BORDER = 8
+_THRESH_BORDER_ASYMMETRY = 2
+# Share of content pixels above the border threshold.
+_THRESH_LIT = 0.5
+
+class Layout:
+    def __init__(
+            self, size: Sequence[int], scale: float,
+            offset: Sequence[float]) -> None:
+        self.size = tuple(size)
+        self.scale = scale
+        self.offset = tuple(offset)
+
+    @property
+    def is_reference(self) -> bool:
+        return self.size == REFERENCE_SIZE and self.scale == 1 \
+            and self.offset == (0, 0)
+
+    def point(self, x: float, y: float) -> tuple[int, int]:
+        return (round(self.offset[0] + x * self.scale),
+                round(self.offset[1] + y * self.scale))
+
+    def bbox(self, bbox: Sequence[int]) -> tuple[int, int, int, int]:
+        x, y, w, h = bbox
+        x0, y0 = self.point(x, y)
+        x1, y1 = self.point(x + w, y + h)
+        return x0, y0, max(1, x1 - x0), max(1, y1 - y0)
+
+    def to_reference(self, image: NDArray, bbox: Sequence[int]) -> NDArray:
+        if self.is_reference:
+            return image
+        return cv2.resize(
+            image, (bbox[2], bbox[3]), interpolation=cv2.INTER_LINEAR)
+
+    def reference_frame(self, frame: Frame) -> Frame:
+        if self.is_reference:
+            return frame
+        transform = np.array((
+            (self.scale, 0, self.offset[0]),
+            (0, self.scale, self.offset[1])))
+        image = cv2.warpAffine(
+            frame.snapshot().image, transform, REFERENCE_SIZE,
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+        return Frame(image, frame.info)
+
+    def to_dict(self) -> dict:
+        return {'size': self.size, 'scale': self.scale, 'offset': self.offset}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Layout':
+        return Layout(data['size'], data['scale'], data['offset'])
+
+def calibrate(frame: Frame) -> Layout:
+    # Expects the setup room, which is lit across most of the content.
+    height, width = frame.shape[:2]
+    path = _CACHE_DIR / f'{width}x{height}.json'
+    if path.exists():
+        layout = Layout.from_dict(json.loads(path.read_text()))
+        if _is_plausible(layout, (width, height)):
+            return layout
+        _LOGGER.warning('discarding calibration %s', path)
+        path.unlink()
+
+    image = frame.snapshot().image
+    content = _find_content(image)
+    layout = _derive_layout(image, content)
+    if not _is_letterbox(content, (width, height)) \
+            or not _is_plausible(layout, (width, height)) \
+            or not _is_lit(image, layout):
+        # Not cached, the next start calibrates again.
+        _LOGGER.warning('calibration failed, assuming no letterbox')
+        return _derive_layout(image, (0, 0, width, height))
+
+    _CACHE_DIR.mkdir(exist_ok=True)
+    path.write_text(json.dumps(layout.to_dict(), indent=4))
+    return layout
+
+def _derive_layout(image: NDArray, content: Sequence[int]) -> Layout:
+    height, width = image.shape[:2]
+    x, y, w, h = content
+
+    # The game keeps its vertical field of view, so content scales with
+    # the height and is centered horizontally.
+    scale = h / REFERENCE_SIZE[1]
+    offset = (x + (w - REFERENCE_SIZE[0] * scale) / 2, y)
+    return Layout((width, height), scale, offset)
+
+def _is_letterbox(content: Sequence[int], size: Sequence[int]) -> bool:
+    # Bars only pad 16:9 content, anything else is dark scenery.
+    _, _, w, h = content
+    if (w, h) == tuple(size):
+        return True
+    return abs(w * REFERENCE_SIZE[1] - h * REFERENCE_SIZE[0]) \
+        <= _THRESH_BORDER_ASYMMETRY * max(REFERENCE_SIZE)
+
+def _is_plausible(layout: Layout, size: Sequence[int]) -> bool:
+    if layout.size != tuple(size) or layout.scale <= 0:
+        return False
+    x0, y0 = layout.point(0, 0)
+    x1, y1 = layout.point(*REFERENCE_SIZE)
+    # Letterboxing is symmetric, so the content is centered.
+    return y0 >= 0 and y1 <= size[1] \
+        and abs(x0 + x1 - size[0]) <= 2 * _THRESH_BORDER_ASYMMETRY \
+        and abs(y0 + y1 - size[1]) <= 2 * _THRESH_BORDER_ASYMMETRY
+
+def _is_lit(image: NDArray, layout: Layout) -> bool:
+    x, y, w, h = layout.bbox((0, 0, *REFERENCE_SIZE))
+    content = bgr2gray(image)[max(0, y):y+h, max(0, x):x+w]
+    return content.size > 0 \
+        and np.mean(content > _THRESH_BORDER) >= _THRESH_LIT
+
+def _find_content(image: NDArray) -> tuple[int, int, int, int]:
+    height, width = image.shape[:2]
+    gray = bgr2gray(image)
+    rows = np.flatnonzero(gray.max(axis=1) > _THRESH_BORDER)
+    cols = np.flatnonzero(gray.max(axis=0) > _THRESH_BORDER)
+    if rows.size == 0 or cols.size == 0:
+        return 0, 0, width, height
+
+    # Only symmetric black bars are letterboxing, dark scenery is not.
+    top, bot = rows[0], height - 1 - rows[-1]
+    lft, rgh = cols[0], width - 1 - cols[-1]
+    if abs(top - bot) > _THRESH_BORDER_ASYMMETRY:
+        top, bot = 0, 0
+    if abs(lft - rgh) > _THRESH_BORDER_ASYMMETRY:
+        lft, rgh = 0, 0
+    return int(lft), int(top), int(width - lft - rgh), int(height - top - bot)
@@ -0,0 +1,53 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+_KEY_SIZE = 16
+
+
+class MemoCache:
+    # Maps the hash of a binarized model input to the logits it produced,
+    # evicting the least recently used entries beyond the capacity.
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._entries = OrderedDict[bytes, torch.Tensor]()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Optional[torch.Tensor]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value: torch.Tensor) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+
+    def update(self, keys: torch.Tensor, values: torch.Tensor) -> None:
+        for key, value in zip(keys.numpy(), values):
+            self.put(key.tobytes(), value)
+
+    def to_tensors(self) -> tuple[torch.Tensor, torch.Tensor]:
+        keys = np.frombuffer(b''.join(self._entries), dtype=np.uint8)
+        return (torch.from_numpy(keys.reshape(-1, _KEY_SIZE).copy()),
+                torch.stack(list(self._entries.values())))
+
+def memo_key(image: NDArray) -> bytes:
+    # The size is part of the key, the packed bits alone are ambiguous.
+    digest = hashlib.blake2b(digest_size=_KEY_SIZE)
+    digest.update(np.array(image.shape, dtype=np.int32).tobytes())
+    digest.update(np.packbits(image > 127).tobytes())
+    return digest.digest()
@@ -0,0 +1,49 @@
+import copy
+import warnings
+from typing import Iterable
+
+import torch
+import torch.nn as nn
+
+PRECISIONS = ('fp32', 'int8-dynamic', 'int8-static', 'bf16')
+
+
+def reduce_precision(
+        model: nn.Module, precision: str,
+        calibration: Iterable[torch.Tensor]) -> tuple[nn.Module, torch.dtype]:
+    # Returns the converted model and the dtype it expects its input in.
+    if precision == 'fp32':
+        return model, torch.float32
+    if precision == 'bf16':
+        return copy.deepcopy(model).to(torch.bfloat16), torch.bfloat16
+
+    # torch.ao.quantization is deprecated in favour of torchao, which is not
+    # a dependency here.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from torch.ao.quantization import (get_default_qconfig_mapping,
+                                           quantize_dynamic)
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if precision == 'int8-dynamic':
+            # Dynamic quantization only covers the linear layers.
+            model = quantize_dynamic(
+                copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8)
+            return model, torch.float32
+
+        if precision == 'int8-static':
+            calibration = list(calibration)
+            model = prepare_fx(
+                copy.deepcopy(model), get_default_qconfig_mapping('x86'),
+                (calibration[0],))
+            with torch.no_grad():
+                for batch in calibration:
+                    model(batch)
+            return convert_fx(model), torch.float32
+
+    raise ValueError(f'Unknown precision {precision}')
+
+def top1(logits: torch.Tensor | Iterable[torch.Tensor]) -> torch.Tensor:
+    if isinstance(logits, torch.Tensor):
+        return logits.argmax(dim=1)
+    return torch.cat([x.argmax(dim=1) for x in logits])
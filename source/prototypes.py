@@ -0,0 +1,141 @@
+import logging
+from pathlib import Path
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+_LOGGER = logging.getLogger('cascade')
+_GLYPH_SIZE = 16
+_ASPECT_SCALE = 32
+_MAX_ASPECT_RATIO = 1.25
+_THUMBNAIL_SIZE = 8
+_POPCOUNT = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1) \
+    .astype(np.uint8)
+
+
+class PrototypeMatcher:
+    # Nearest prototype classifier over cheap image features. An image is
+    # only labelled when it is close to a prototype and clearly closer to it
+    # than to any prototype of another class, otherwise it is left to the
+    # model. Decisions are logged to the cascade logger.
+    MAX_DISTANCE = 0
+    MARGIN = 0
+
+    def __init__(
+            self, name: str, images: Sequence[NDArray], labels: Sequence[int],
+            max_distance: Optional[int] = None,
+            margin: Optional[int] = None) -> None:
+        # Recorded crops repeat a lot, duplicates are dropped.
+        unique = dict.fromkeys(zip(map(bytes, self._features(images)), labels))
+        self._name = name
+        self._prototypes = np.frombuffer(
+            b''.join(x for x, _ in unique), dtype=np.uint8) \
+            .reshape(len(unique), -1)
+        self._labels = np.array([x for _, x in unique])
+        self._classes = np.unique(self._labels)
+        self._max_distance = self.MAX_DISTANCE if max_distance is None \
+            else max_distance
+        self._margin = self.MARGIN if margin is None else margin
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def match(self, images: Sequence[NDArray]) -> list[Optional[int]]:
+        if not images:
+            return []
+        distances = self._distances(self._features(images), self._prototypes)
+        per_class = np.stack(
+            [distances[:, self._labels == x].min(axis=1)
+             for x in self._classes], axis=1)
+        if len(self._classes) > 1:
+            nearest, second = np.partition(per_class, 1, axis=1)[:, :2].T
+        else:
+            nearest = per_class[:, 0]
+            second = np.full_like(nearest, np.iinfo(np.int32).max)
+        confident = (nearest <= self._max_distance) \
+            & (second - nearest >= self._margin)
+        best = self._classes[per_class.argmin(axis=1)]
+
+        result = []
+        for label, ok, distance, other in zip(
+                best, confident, nearest, second):
+            _LOGGER.debug(
+                '%s %s %d distance %d margin %d', self._name,
+                'accept' if ok else 'reject', label, distance,
+                other - distance)
+            result.append(int(label) if ok else None)
+        self.hits += int(confident.sum())
+        self.misses += len(result) - int(confident.sum())
+        return result
+
+    def _features(self, images: Sequence[NDArray]) -> NDArray:
+        raise NotImplementedError
+
+    def _distances(self, features: NDArray, prototypes: NDArray) -> NDArray:
+        raise NotImplementedError
+
+class GlyphMatcher(PrototypeMatcher):
+    # Binary glyph crops stretched to 16x16 bits, compared by Hamming
+    # distance. Prototypes of a different aspect ratio are out of reach.
+    MAX_DISTANCE = 16
+    MARGIN = 12
+
+    def _features(self, images: Sequence[NDArray]) -> NDArray:
+        small = np.stack([
+            cv2.resize(x, (_GLYPH_SIZE, _GLYPH_SIZE),
+                       interpolation=cv2.INTER_AREA)
+            for x in images])
+        bits = np.packbits(small.reshape(len(images), -1) > 127, axis=1)
+        aspects = np.log([x.shape[1] / x.shape[0] for x in images])
+        aspects = np.clip(np.round(aspects * _ASPECT_SCALE) + 128, 0, 255)
+        return np.hstack([bits, aspects.astype(np.uint8)[:, None]])
+
+    def _distances(self, features: NDArray, prototypes: NDArray) -> NDArray:
+        bits = features[:, None, :-1] ^ prototypes[None, :, :-1]
+        distances = _POPCOUNT[bits].sum(axis=2, dtype=np.int32)
+        aspects = np.abs(
+            features[:, None, -1].astype(np.int32) - prototypes[None, :, -1])
+        distances[aspects > np.log(_MAX_ASPECT_RATIO) * _ASPECT_SCALE] = \
+            _GLYPH_SIZE * _GLYPH_SIZE
+        return distances
+
+class ThumbnailMatcher(PrototypeMatcher):
+    # BGR images shrunk to 8x8, compared by the mean absolute difference
+    # of their pixels.
+    MAX_DISTANCE = 12
+    MARGIN = 8
+
+    def _features(self, images: Sequence[NDArray]) -> NDArray:
+        return np.stack([
+            cv2.resize(x, (_THUMBNAIL_SIZE, _THUMBNAIL_SIZE),
+                       interpolation=cv2.INTER_AREA).ravel()
+            for x in images])
+
+    def _distances(self, features: NDArray, prototypes: NDArray) -> NDArray:
+        return np.abs(
+            features[:, None].astype(np.int16) - prototypes[None]) \
+            .sum(axis=2, dtype=np.int32) // features.shape[1]
+
+def load_prototypes(
+        path: Path, matcher: type[PrototypeMatcher]) \
+            -> Optional[PrototypeMatcher]:
+    # Prototypes are read from path/<label>/*.png, the layout written by
+    # --save-crops.
+    flags = cv2.IMREAD_GRAYSCALE if matcher is GlyphMatcher \
+        else cv2.IMREAD_COLOR
+    images = []
+    labels = []
+    for label_dir in sorted(Path(path).glob('*')):
+        if not label_dir.name.isdigit():
+            continue
+        for file in sorted(label_dir.glob('*.png')):
+            images.append(cv2.imread(str(file), flags))
+            labels.append(int(label_dir.name))
+    if not images:
+        return None
+    return matcher(Path(path).name, images, labels)
@@ -0,0 +1,218 @@
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+from frame import Frame
+from numpy.typing import NDArray
+from screen_capture import FrameInfo
+
+
+class Clock:
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def monotonic_ns(self) -> int:
+        return time.monotonic_ns()
+
+class VirtualClock:
+    def __init__(self, start_ns: int = 0) -> None:
+        self._now = start_ns
+
+    def sleep(self, seconds: float) -> None:
+        self._now += int(seconds * 1e9)
+
+    def monotonic_ns(self) -> int:
+        return self._now
+
+    def advance_to(self, timestamp_ns: int) -> None:
+        self._now = max(self._now, timestamp_ns)
+
+class Recording:
+    # Events are timestamped by the caller and written in order by a
+    # writer thread, so saving frames does not slow down the polling loops
+    # being recorded. Nothing is dropped, a replay needs every capture.
+    def __init__(self, path: Path, clock: Clock) -> None:
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._events = open(self._path / 'events.jsonl', 'w')
+        self._clock = clock
+        self._capture_count = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add_mouse(self, action: str, *args: int) -> None:
+        self._write({'type': 'mouse', 'action': action, 'args': args})
+
+    def add_capture(
+            self, bboxes: Optional[Sequence[Sequence[int]]],
+            images: Sequence[NDArray], info: Optional[FrameInfo]) -> None:
+        name = f'{self._capture_count:06d}.npz'
+        self._capture_count += 1
+        self._write({
+            'type': 'capture', 'file': name,
+            'bboxes': None if bboxes is None else [list(x) for x in bboxes],
+            'info': None if info is None else list(info)}, images)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._events.close()
+
+    def _write(self, event: dict, images: Sequence[NDArray] = ()) -> None:
+        event['time'] = self._clock.monotonic_ns()
+        self._queue.put((event, images))
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            event, images = item
+            if images:
+                np.savez(self._path / event['file'], *images)
+            self._events.write(json.dumps(event) + '\n')
+
+class RecordingMouse:
+    def __init__(self, recording: Recording, mouse=None) -> None:
+        self._recording = recording
+        self._mouse = mouse
+
+    def left_down(self):
+        self._record('left_down')
+
+    def left_up(self):
+        self._record('left_up')
+
+    def right_down(self):
+        self._record('right_down')
+
+    def right_up(self):
+        self._record('right_up')
+
+    def move(self, x, y):
+        self._record('move', x, y)
+
+    def _record(self, action: str, *args: int) -> None:
+        if self._mouse is not None:
+            getattr(self._mouse, action)(*args)
+        self._recording.add_mouse(action, *args)
+
+class RecordingScreenCapture:
+    def __init__(self, recording: Recording, screen_capture) -> None:
+        self._recording = recording
+        self._screen_capture = screen_capture
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._screen_capture.size
+
+    @property
+    def info(self) -> Optional[FrameInfo]:
+        return self._screen_capture.info
+
+    def __call__(self) -> Frame:
+        frame = self._screen_capture().snapshot()
+        self._recording.add_capture(None, [frame.image], frame.info)
+        return frame
+
+    def grab_regions(self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        images = self._screen_capture.grab_regions(bboxes)
+        # Regions may be views into the capture buffer.
+        self._recording.add_capture(
+            bboxes, [np.array(x) for x in images], self.info)
+        return images
+
+    def start_stream(self, *args, **kwargs) -> None:
+        self._screen_capture.start_stream(*args, **kwargs)
+
+    def stop_stream(self) -> None:
+        self._screen_capture.stop_stream()
+
+class ReplayScreenCapture:
+    def __init__(self, path: Path, clock: VirtualClock) -> None:
+        self._path = Path(path)
+        self._clock = clock
+        with open(self._path / 'events.jsonl') as f:
+            events = [json.loads(x) for x in f]
+        self._captures = [x for x in events if x['type'] == 'capture']
+        self._next = 0
+        self.info: Optional[FrameInfo] = None
+
+        first_full = next(
+            (x for x in self._captures if x['bboxes'] is None), None)
+        if first_full is not None:
+            height, width = self._load(first_full)[0].shape[:2]
+            self._size = width, height
+        else:
+            self._size = 1920, 1080
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    @property
+    def remaining(self) -> int:
+        return len(self._captures) - self._next
+
+    def __call__(self) -> Frame:
+        images = self._replay(None)
+        return Frame(images[0], self.info)
+
+    def grab_regions(self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        return self._replay(bboxes)
+
+    def start_stream(self, *args, **kwargs) -> None:
+        pass
+
+    def stop_stream(self) -> None:
+        pass
+
+    def _replay(
+            self, bboxes: Optional[Sequence[Sequence[int]]]) -> list[NDArray]:
+        if self._next >= len(self._captures):
+            raise EOFError('Recording has no more captures')
+        event = self._captures[self._next]
+        self._next += 1
+
+        expected = None if bboxes is None else [list(x) for x in bboxes]
+        if event['bboxes'] != expected:
+            raise ValueError(
+                f'Capture {self._next-1} recorded {event["bboxes"]}, '
+                f'replay requested {expected}')
+
+        # Polling loops only see time pass through the frames they grab.
+        self._clock.advance_to(event['time'])
+        self.info = None if event['info'] is None else FrameInfo(*event['info'])
+        return self._load(event)
+
+    def _load(self, event: dict) -> list[NDArray]:
+        with np.load(self._path / event['file']) as data:
+            return [data[f'arr_{i}'] for i in range(len(data.files))]
+
+def first_timestamp(path: Path) -> int:
+    with open(Path(path) / 'events.jsonl') as f:
+        line = f.readline()
+    return json.loads(line)['time'] if line else 0
+
+def compare_mouse(recorded: Path, replayed: Path) -> Optional[str]:
+    # Returns where the replayed mouse actions first differ from the
+    # recorded ones, or None if the replay did the same thing.
+    expected = _mouse_events(recorded)
+    actual = _mouse_events(replayed)
+    for i, (x, y) in enumerate(zip(expected, actual)):
+        if x[:2] != y[:2]:
+            return (f'Mouse action {i} at {(x[2]-expected[0][2])/1e9:.3f} s '
+                    f'recorded {x[:2]}, replayed {y[:2]}')
+    if len(expected) != len(actual):
+        return (f'Recorded {len(expected)} mouse actions, '
+                f'replayed {len(actual)}')
+    return None
+
+def _mouse_events(path: Path) -> list[tuple[str, list[int], int]]:
+    with open(Path(path) / 'events.jsonl') as f:
+        events = [json.loads(x) for x in f]
+    return [(x['action'], x['args'], x['time'])
+            for x in events if x['type'] == 'mouse']
@@ -0,0 +1,34 @@
+import threading
+from typing import Hashable, Sequence
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+
+class ScratchArena:
+    # Hands out reusable buffers keyed by name, shape and dtype, for the
+    # masks and intermediates of detectors that run in polling loops. The
+    # same key returns the same buffer on the next call, so a buffer must
+    # not outlive the call that borrowed it. Each thread has its own
+    # buffers.
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def get(
+            self, name: Hashable, shape: Sequence[int],
+            dtype: DTypeLike = np.uint8) -> NDArray:
+        buffers = self._buffers()
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.empty(shape, dtype)
+        return buffer
+
+    def clear(self) -> None:
+        self._buffers().clear()
+
+    def _buffers(self) -> dict:
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
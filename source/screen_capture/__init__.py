@@ -1,5 +1,8 @@
 import platform
 
+from .frame_info import FrameInfo
+from .recorder import FrameReader, FrameRecorder, RecordedScreenCapture
+
 if platform.system() == 'Linux':
     from .linux_hook import ScreenCapture
 elif platform.system() == 'Windows':
@@ -0,0 +1,8 @@
+from typing import NamedTuple
+
+
+class FrameInfo(NamedTuple):
+    frame: int
+    swap_ns: int
+    readback_ns: int
+    latency: int = 0
@@ -1,28 +1,243 @@
+import asyncio
+import ctypes
+import platform
+import threading
 import time
 from multiprocessing import resource_tracker
 from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Sequence
 
 import cv2
 import numpy as np
+from frame import Frame
+from numpy.typing import NDArray
 
+from .frame_info import FrameInfo
+
+_MAX_WIDTH = 1920
+_MAX_HEIGHT = 1080
+_IMG_SIZE = _MAX_WIDTH * _MAX_HEIGHT * 3
+_MAX_RECTS = 16
+_MAX_SLOTS = 4
+_TIMEOUT_NS = 2_000_000_000
+
+_LIBC = ctypes.CDLL(None, use_errno=True)
+# Other architectures poll instead of waiting on the futex.
+_SYS_FUTEX = {'x86_64': 202, 'aarch64': 98}.get(platform.machine())
+_FUTEX_WAIT = 0
+_POLL_INTERVAL = 0.0005
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [
+        ('tv_sec', ctypes.c_long),
+        ('tv_nsec', ctypes.c_long)]
+
+class _Rect(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_int32),
+        ('y', ctypes.c_int32),
+        ('w', ctypes.c_int32),
+        ('h', ctypes.c_int32)]
+
+class _Slot(ctypes.Structure):
+    _fields_ = [
+        ('seq', ctypes.c_uint32),
+        ('latency', ctypes.c_uint32),
+        ('frame', ctypes.c_uint64),
+        ('swap_ns', ctypes.c_uint64),
+        ('readback_ns', ctypes.c_uint64),
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32)]
+
+# NOTE: Must match struct ktane_ctl in linux_hook/ktane_shm.h.
+class _Control(ctypes.Structure):
+    _fields_ = [
+        ('request', ctypes.c_uint32),
+        ('rect_count', ctypes.c_uint32),
+        ('rects', _Rect * _MAX_RECTS),
+        ('stream_interval', ctypes.c_uint32),
+        ('slot_count', ctypes.c_uint32),
+        ('latest', ctypes.c_uint32),
+        ('published', ctypes.c_uint32),
+        ('async_readback', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32),
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+        ('frame', ctypes.c_uint64),
+        ('slots', _Slot * _MAX_SLOTS)]
+
+def _futex_wait(addr: ctypes.c_void_p, expected: int, deadline: int) -> None:
+    remaining = deadline - time.monotonic_ns()
+    if remaining <= 0:
+        raise TimeoutError('Timeout')
+    if _SYS_FUTEX is None:
+        time.sleep(_POLL_INTERVAL)
+        return
+    timeout = _Timespec(*divmod(remaining, 1_000_000_000))
+    _LIBC.syscall(
+        ctypes.c_long(_SYS_FUTEX), addr,
+        ctypes.c_int(_FUTEX_WAIT), ctypes.c_uint32(expected),
+        ctypes.byref(timeout), None, ctypes.c_int(0))
 
 class ScreenCapture:
-    def __init__(self):
-        self.ctl_shm = SharedMemory('ktane_ctl', size=4)
-        self.img_shm = SharedMemory('ktane_img', size=1920*1080*3)
+    def __init__(self, async_readback: bool = False):
+        self.ctl_shm = SharedMemory('ktane_ctl', size=ctypes.sizeof(_Control))
+        self.img_shm = SharedMemory('ktane_img', size=_IMG_SIZE*_MAX_SLOTS)
 
         resource_tracker.unregister(self.ctl_shm._name, 'shared_memory')
         resource_tracker.unregister(self.img_shm._name, 'shared_memory')
 
-        self.ctl = np.ndarray(1, dtype=np.uint32, buffer=self.ctl_shm.buf)
-        self.img = np.ndarray((1080, 1920, 3), dtype=np.uint8, buffer=self.img_shm.buf)
-    
-    def __call__(self):
-        self.ctl[0] = 1
-        start = time.monotonic_ns()
-        while self.ctl[0] != 0:
-            time.sleep(0)
-            end = time.monotonic_ns()
-            if (end - start) >= 2e9:
-                raise TimeoutError('Timeout')
-        return cv2.flip(self.img, 0)
+        self.ctl = _Control.from_buffer(self.ctl_shm.buf)
+        # Reads pixels through a PBO one swap later instead of stalling
+        # the game's render thread in glReadPixels.
+        self.ctl.async_readback = async_readback
+
+        base = ctypes.addressof(self.ctl)
+        self._request_addr = ctypes.c_void_p(base + _Control.request.offset)
+        self._published_addr = ctypes.c_void_p(base + _Control.published.offset)
+        self._lock = threading.Lock()
+
+        self._streaming = False
+        self._stream_bboxes: Optional[tuple[tuple[int, ...], ...]] = None
+        self._last_frame = 0
+        self.info: Optional[FrameInfo] = None
+
+    @property
+    def size(self) -> tuple[int, int]:
+        if self.ctl.width == 0:
+            return _MAX_WIDTH, _MAX_HEIGHT
+        return self.ctl.width, self.ctl.height
+
+    def __call__(self) -> Frame:
+        with self._lock:
+            if self._streaming:
+                if self._stream_bboxes is not None:
+                    raise ValueError('Stream does not contain the full frame')
+                return self._read_latest(None)[0]
+
+            self._set_rects(None)
+            self._request()
+            return self._read_slot(0, None)[0]
+
+    def grab_regions(self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        bboxes = self._check_bboxes(bboxes)
+        with self._lock:
+            if self._streaming:
+                return self._read_latest(bboxes)
+
+            self._set_rects(bboxes)
+            self._request()
+            return self._read_slot(0, bboxes)
+
+    async def grab_async(self) -> Frame:
+        return await asyncio.get_running_loop().run_in_executor(None, self)
+
+    async def grab_regions_async(
+            self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.grab_regions, bboxes)
+
+    def start_stream(
+            self, bboxes: Optional[Sequence[Sequence[int]]] = None,
+            interval: int = 1, slot_count: int = 3) -> None:
+        if not 2 <= slot_count <= _MAX_SLOTS:
+            raise ValueError(f'Expected 2 to {_MAX_SLOTS} slots')
+        if interval < 1:
+            raise ValueError('Interval must be positive')
+        if bboxes is not None:
+            bboxes = self._check_bboxes(bboxes)
+
+        with self._lock:
+            self.ctl.stream_interval = 0
+            self._set_rects(bboxes)
+            self.ctl.slot_count = slot_count
+            self.ctl.latest = 0
+            self.ctl.stream_interval = interval
+
+            self._streaming = True
+            self._stream_bboxes = bboxes
+            self._last_frame = self.ctl.slots[0].frame
+
+    def stop_stream(self) -> None:
+        with self._lock:
+            self.ctl.stream_interval = 0
+            self._streaming = False
+            self._stream_bboxes = None
+
+    @staticmethod
+    def _check_bboxes(
+            bboxes: Sequence[Sequence[int]]) -> tuple[tuple[int, ...], ...]:
+        if not 0 < len(bboxes) <= _MAX_RECTS:
+            raise ValueError(f'Expected 1 to {_MAX_RECTS} regions')
+        if sum(w * h * 3 for _, _, w, h in bboxes) > _IMG_SIZE:
+            raise ValueError('Regions do not fit into the image buffer')
+        return tuple(tuple(bbox) for bbox in bboxes)
+
+    def _set_rects(self, bboxes: Optional[Sequence[Sequence[int]]]) -> None:
+        if bboxes is None:
+            self.ctl.rect_count = 0
+            return
+        for rect, bbox in zip(self.ctl.rects, bboxes):
+            rect.x, rect.y, rect.w, rect.h = bbox
+        self.ctl.rect_count = len(bboxes)
+
+    def _request(self) -> None:
+        self.ctl.request = 1
+        deadline = time.monotonic_ns() + _TIMEOUT_NS
+        while self.ctl.request != 0:
+            # Sleeps until the hook clears the request and wakes us up.
+            _futex_wait(self._request_addr, 1, deadline)
+
+    def _read_latest(
+            self, bboxes: Optional[Sequence[Sequence[int]]]) -> list:
+        packed = self._stream_bboxes is not None
+        if packed and bboxes != self._stream_bboxes:
+            raise ValueError('Regions differ from the streamed regions')
+
+        deadline = time.monotonic_ns() + _TIMEOUT_NS
+        while True:
+            published = self.ctl.published
+            index = self.ctl.latest
+            slot = self.ctl.slots[index]
+            seq = slot.seq
+
+            # Wait for the next swap instead of handing out the same frame.
+            if slot.frame == self._last_frame:
+                _futex_wait(self._published_addr, published, deadline)
+                continue
+            if seq & 1:
+                continue
+
+            images = self._read_slot(index, bboxes, packed, seq)
+            if slot.seq == seq:
+                self._last_frame = self.info.frame
+                return images
+
+    def _read_slot(
+            self, index: int, bboxes: Optional[Sequence[Sequence[int]]],
+            packed: bool = True, seq: Optional[int] = None) -> list:
+        slot = self.ctl.slots[index]
+        self.info = FrameInfo(
+            slot.frame, slot.swap_ns, slot.readback_ns, slot.latency)
+
+        offset = index * _IMG_SIZE
+        if bboxes is None or not packed:
+            # OpenGL rows start at the bottom, a negative stride view flips
+            # the frame without copying it.
+            image = np.ndarray(
+                (slot.height, slot.width, 3), dtype=np.uint8,
+                buffer=self.img_shm.buf, offset=offset)[::-1]
+            seq = slot.seq if seq is None else seq
+            frame = Frame(image, self.info, lambda: slot.seq == seq)
+            if bboxes is None:
+                return [frame]
+            return [frame.crop(bbox) for bbox in bboxes]
+
+        result = []
+        for _, _, w, h in bboxes:
+            region = np.ndarray(
+                (h, w, 3), dtype=np.uint8,
+                buffer=self.img_shm.buf, offset=offset)
+            result.append(cv2.flip(region, 0))
+            offset += w * h * 3
+        return result
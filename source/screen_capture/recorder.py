@@ -0,0 +1,252 @@
+import logging
+import mmap
+import queue
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .frame_info import FrameInfo
+
+# File layout:
+#     header   magic, width, height, tile size
+#     frames   marker, frame header, changed tile indices, zlib compressed tiles
+#     index    offset, timestamp, keyframe flag and frames dropped before
+#              every frame
+#     trailer  index offset, frame count, total dropped frames, magic
+# Keyframes hold every tile, other frames only tiles that changed since
+# the previous frame. Region grabs are pasted into the last frame first.
+_MAGIC = b'KTR2'
+_HEADER = struct.Struct('<4sIII')
+_FRAME = struct.Struct('<4sQIII')
+_FRAME_MAGIC = b'KTRF'
+_INDEX = np.dtype([
+    ('offset', '<u8'), ('time', '<u8'), ('key', '<u4'), ('dropped', '<u4')])
+_TRAILER = struct.Struct('<QQQ4s')
+_KEYFRAME = 1
+
+_LOGGER = logging.getLogger('recorder')
+
+
+class FrameRecorder:
+    def __init__(
+            self, path: Path, width: int, height: int, tile_size: int = 32,
+            keyframe_interval: int = 120, queue_size: int = 8) -> None:
+        self._path = path
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, width, height, tile_size))
+
+        self._tile_size = tile_size
+        self._keyframe_interval = keyframe_interval
+        self._canvas = np.zeros(
+            (_round_up(height, tile_size), _round_up(width, tile_size), 3),
+            dtype=np.uint8)
+        self._prev_tiles: Optional[NDArray] = None
+        self._index = []
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._unreported = 0
+        self.dropped = 0
+        self._thread.start()
+
+    def submit(
+            self, images: Sequence[NDArray], timestamp_ns: int,
+            bboxes: Optional[Sequence[Sequence[int]]] = None) -> None:
+        # Frames may be views into the capture buffer, so copy them here
+        # and leave everything else to the writer thread. Only the capture
+        # thread fills the queue, so a frame that fits is never copied
+        # for nothing.
+        if self._queue.full():
+            self.dropped += 1
+            self._unreported += 1
+            return
+        self._queue.put_nowait(([np.array(x) for x in images], timestamp_ns,
+                                bboxes, self._unreported))
+        self._unreported = 0
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+        offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=_INDEX).tobytes())
+        self._file.write(_TRAILER.pack(
+            offset, len(self._index), self.dropped, _MAGIC))
+        self._file.close()
+        if self.dropped:
+            _LOGGER.warning(
+                '%s dropped %d of %d frames', self._path, self.dropped,
+                self.dropped + len(self._index))
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            self._write(*item)
+
+    def _write(
+            self, images: list[NDArray], timestamp_ns: int,
+            bboxes: Optional[Sequence[Sequence[int]]], dropped: int) -> None:
+        if bboxes is None:
+            height, width = images[0].shape[:2]
+            self._canvas[:height, :width] = images[0]
+        else:
+            for image, (x, y, w, h) in zip(images, bboxes):
+                self._canvas[y:y+h, x:x+w] = image
+
+        tiles = _to_tiles(self._canvas, self._tile_size)
+        is_key = self._prev_tiles is None or \
+            len(self._index) % self._keyframe_interval == 0
+        if is_key:
+            changed = np.arange(len(tiles), dtype=np.uint32)
+        else:
+            diff = (tiles != self._prev_tiles).reshape(len(tiles), -1)
+            changed = np.flatnonzero(diff.any(axis=1)).astype(np.uint32)
+        self._prev_tiles = tiles.copy()
+
+        payload = zlib.compress(tiles[changed].tobytes(), 1)
+        self._index.append((self._file.tell(), timestamp_ns, is_key, dropped))
+        self._file.write(_FRAME.pack(
+            _FRAME_MAGIC, timestamp_ns, len(changed),
+            _KEYFRAME if is_key else 0, dropped))
+        self._file.write(changed.tobytes())
+        self._file.write(struct.pack('<I', len(payload)))
+        self._file.write(payload)
+
+class FrameReader:
+    def __init__(self, path: Path) -> None:
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.width, self.height, self._tile_size = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError('Not a frame recording')
+
+        offset, count, dropped, magic = _TRAILER.unpack_from(
+            self._map, len(self._map) - _TRAILER.size)
+        if magic == _MAGIC:
+            self._index = np.frombuffer(
+                self._map, dtype=_INDEX, count=count, offset=offset)
+            self.dropped = dropped
+        else:
+            self._index = self._scan()
+            self.dropped = int(self._index['dropped'].sum())
+
+        self._canvas = np.zeros(
+            (_round_up(self.height, self._tile_size),
+             _round_up(self.width, self._tile_size), 3), dtype=np.uint8)
+        self._position = -1
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, ndx: int) -> tuple[NDArray, int]:
+        if not 0 <= ndx < len(self._index):
+            raise IndexError(ndx)
+
+        if not self._position < ndx or \
+                self._index['key'][self._position+1:ndx+1].any():
+            keys = np.flatnonzero(self._index['key'][:ndx+1])
+            self._position = keys[-1] - 1
+        for position in range(self._position + 1, ndx + 1):
+            self._apply(int(self._index['offset'][position]))
+        self._position = ndx
+
+        image = self._canvas[:self.height, :self.width].copy()
+        return image, int(self._index['time'][ndx])
+
+    def gaps(self) -> list[tuple[int, int]]:
+        # Frames that had frames dropped right before them, with the count.
+        ndx = np.flatnonzero(self._index['dropped'])
+        return list(zip(ndx.tolist(), self._index['dropped'][ndx].tolist()))
+
+    def close(self) -> None:
+        self._index = None
+        self._map.close()
+        self._file.close()
+
+    def _apply(self, offset: int) -> None:
+        _, _, count, _, _ = _FRAME.unpack_from(self._map, offset)
+        offset += _FRAME.size
+        changed = np.frombuffer(
+            self._map, dtype=np.uint32, count=count, offset=offset)
+        offset += changed.nbytes
+        size, = struct.unpack_from('<I', self._map, offset)
+        offset += 4
+
+        t = self._tile_size
+        data = zlib.decompress(self._map[offset:offset+size])
+        data = np.frombuffer(data, dtype=np.uint8).reshape(-1, t, t, 3)
+        tiles_x = self._canvas.shape[1] // t
+        for tile, ndx in zip(data, changed.tolist()):
+            y, x = divmod(ndx, tiles_x)
+            self._canvas[y*t:(y+1)*t, x*t:(x+1)*t] = tile
+
+    def _scan(self) -> NDArray:
+        # Recording was not closed, rebuild the index from frame headers.
+        index = []
+        offset = _HEADER.size
+        while offset + _FRAME.size + 4 <= len(self._map):
+            magic, timestamp, count, flags, dropped = \
+                _FRAME.unpack_from(self._map, offset)
+            if magic != _FRAME_MAGIC:
+                break
+            size_offset = offset + _FRAME.size + count * 4
+            if size_offset + 4 > len(self._map):
+                break
+            size, = struct.unpack_from('<I', self._map, size_offset)
+            if size_offset + 4 + size > len(self._map):
+                break
+            index.append((offset, timestamp, flags & _KEYFRAME, dropped))
+            offset = size_offset + 4 + size
+        return np.array(index, dtype=_INDEX)
+
+class RecordedScreenCapture:
+    def __init__(self, screen_capture, path: Path, **kwargs) -> None:
+        self._screen_capture = screen_capture
+        self.recorder = FrameRecorder(path, *screen_capture.size, **kwargs)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._screen_capture.size
+
+    @property
+    def info(self) -> Optional[FrameInfo]:
+        return self._screen_capture.info
+
+    def __call__(self):
+        frame = self._screen_capture()
+        self.recorder.submit([frame.image], self._timestamp())
+        return frame
+
+    def grab_regions(self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        images = self._screen_capture.grab_regions(bboxes)
+        self.recorder.submit(images, self._timestamp(), bboxes)
+        return images
+
+    def start_stream(self, *args, **kwargs) -> None:
+        self._screen_capture.start_stream(*args, **kwargs)
+
+    def stop_stream(self) -> None:
+        self._screen_capture.stop_stream()
+
+    def close(self) -> None:
+        self.recorder.close()
+
+    def _timestamp(self) -> int:
+        info = self._screen_capture.info
+        return time.monotonic_ns() if info is None else info.swap_ns
+
+def _round_up(value: int, multiple: int) -> int:
+    return (value + multiple - 1) // multiple * multiple
+
+def _to_tiles(image: NDArray, tile_size: int) -> NDArray:
+    height, width = image.shape[:2]
+    tiles = image.reshape(
+        height // tile_size, tile_size, width // tile_size, tile_size, 3)
+    return tiles.swapaxes(1, 2).reshape(-1, tile_size, tile_size, 3)
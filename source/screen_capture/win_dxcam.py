@@ -1,11 +1,63 @@
+import asyncio
+import time
+from typing import Optional, Sequence
+
 import dxcam
-import numpy as np
+from frame import Frame
+from numpy.typing import NDArray
+
+from .frame_info import FrameInfo
 
 class ScreenCapture:
-    def __init__(self):
+    def __init__(self, async_readback: bool = False):
         self.camera = dxcam.create(output_color='BGR', max_buffer_len=1)
-    
-    def __call__(self):
-        while (screen := self.camera.grab()) is None:
-            pass
-        return screen
+        self.info: Optional[FrameInfo] = None
+        self._frame = 0
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.camera.width, self.camera.height
+
+    def __call__(self) -> Frame:
+        start = time.monotonic_ns()
+        if self.camera.is_capturing:
+            screen = self.camera.get_latest_frame()
+        else:
+            while (screen := self.camera.grab()) is None:
+                pass
+        self._update_info(start)
+        return Frame(screen, self.info)
+
+    def grab_regions(self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        if len(bboxes) == 1 and not self.camera.is_capturing:
+            start = time.monotonic_ns()
+            x, y, w, h = bboxes[0]
+            while (region := self.camera.grab(region=(x, y, x+w, y+h))) is None:
+                pass
+            self._update_info(start)
+            return [region]
+
+        screen = self()
+        return [screen.crop(bbox) for bbox in bboxes]
+
+    async def grab_async(self) -> Frame:
+        return await asyncio.get_running_loop().run_in_executor(None, self)
+
+    async def grab_regions_async(
+            self, bboxes: Sequence[Sequence[int]]) -> list[NDArray]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.grab_regions, bboxes)
+
+    def start_stream(
+            self, bboxes: Optional[Sequence[Sequence[int]]] = None,
+            interval: int = 1, slot_count: int = 3) -> None:
+        # NOTE: Desktop duplication always streams the full screen.
+        self.camera.start(target_fps=max(1, 60 // interval), video_mode=True)
+
+    def stop_stream(self) -> None:
+        self.camera.stop()
+
+    def _update_info(self, start: int) -> None:
+        self._frame += 1
+        end = time.monotonic_ns()
+        self.info = FrameInfo(self._frame, end, end - start)
@@ -0,0 +1,104 @@
+import sys
+import threading
+from typing import Hashable, Mapping, Optional, Sequence
+
+import cv2
+import numpy as np
+from frame import Frame
+from numpy.typing import NDArray
+from scratch import ScratchArena
+
+ColorRange = tuple[Sequence[int], Sequence[int]]
+_SEGMENTERS = list['ColorSegmenter']()
+
+
+class ColorSegmenter:
+    # Compiles named HSV ranges into one lookup table indexed by quantized
+    # BGR, so a crop is segmented into all ranges at once without an HSV
+    # conversion. Each range owns a bit of the label map, so overlapping
+    # ranges keep working. With fewer bits the table is smaller and faster
+    # to build, but each bin is classified by its center color.
+    def __init__(
+            self, ranges: Mapping[Hashable, ColorRange],
+            bits: int = 8) -> None:
+        self._ranges = dict(ranges)
+        self._bits = bits
+        self._flags = {x: 1 << i for i, x in enumerate(self._ranges)}
+        self._dtype = np.uint8 if len(self._ranges) <= 8 else np.uint16
+        self._table: Optional[NDArray] = None
+        self._scratch = ScratchArena()
+        self._lock = threading.Lock()
+        _SEGMENTERS.append(self)
+
+    def segment(
+            self, image: NDArray | Frame,
+            dst: Optional[NDArray] = None) -> 'Segmentation':
+        # Frames cache their labels, dst only applies to plain images.
+        if isinstance(image, Frame):
+            labels = image.labels(self)
+        else:
+            labels = self.label(image, dst)
+        return Segmentation(labels, self._flags)
+
+    def label(self, image: NDArray, dst: Optional[NDArray] = None) -> NDArray:
+        # The table is indexed by (R, G, B). At full resolution that is the
+        # little endian uint32 view of BGRA pixels without the alpha byte.
+        if self._bits == 8 and sys.byteorder == 'little':
+            bgra = self._scratch.get('bgra', (*image.shape[:2], 4))
+            index = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=bgra) \
+                .view(np.uint32)[:, :, 0]
+            index &= 0xffffff
+        else:
+            quantized = image >> (8 - self._bits)
+            index = quantized[:, :, 2].astype(np.uint32) << 2 * self._bits
+            index |= quantized[:, :, 1].astype(np.uint32) << self._bits
+            index |= quantized[:, :, 0]
+        return np.take(self._get_table(), index, out=dst, mode='clip')
+
+    def _get_table(self) -> NDArray:
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = self._build_table()
+        return self._table
+
+    def _build_table(self) -> NDArray:
+        size = 1 << self._bits
+        shift = 8 - self._bits
+        values = ((np.arange(size) << shift) + (1 << shift >> 1)) \
+            .astype(np.uint8)
+        centers = np.empty((size, size, size, 3), dtype=np.uint8)
+        centers[..., 0] = values[None, None, :]
+        centers[..., 1] = values[None, :, None]
+        centers[..., 2] = values[:, None, None]
+        hsv = cv2.cvtColor(
+            centers.reshape(size * size, size, 3), cv2.COLOR_BGR2HSV)
+        table = np.zeros((size * size, size), dtype=self._dtype)
+        for i, color_range in enumerate(self._ranges.values()):
+            mask = cv2.inRange(hsv, *color_range) >> 7
+            table |= mask.astype(self._dtype) << i
+        return table.ravel()
+
+class Segmentation:
+    def __init__(
+            self, labels: NDArray, flags: Mapping[Hashable, int]) -> None:
+        self._labels = labels
+        self._flags = flags
+
+    @property
+    def labels(self) -> NDArray:
+        return self._labels
+
+    def __getitem__(self, name: Hashable) -> NDArray:
+        # Returns a new 0/255 mask, callers may modify it in place.
+        return cv2.compare(
+            cv2.bitwise_and(self._labels, self._flags[name]), 0,
+            cv2.CMP_GT)
+
+    def count(self, name: Hashable) -> int:
+        return cv2.countNonZero(
+            cv2.bitwise_and(self._labels, self._flags[name]))
+
+def load_segmenters() -> None:
+    for segmenter in _SEGMENTERS:
+        segmenter._get_table()
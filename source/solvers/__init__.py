@@ -1,41 +1,43 @@
+import importlib
+
 from detectors.bomb_modules import BombModuleType
-from numpy.typing import NDArray
+from frame import Frame
+from glyphs import GlyphService
+from inference import CONFIG
+from segmentation import load_segmenters
 
-from .button import Button
-from .complicated_wires import ComplicatedWires
-from .keypad import Keypad
-from .maze import Maze
-from .memory import Memory
-from .morse_code import MorseCode
-from .password import Password
-from .simon_says import SimonSays
-from .whos_on_first import WhosOnFirst
-from .wire_sequences import WireSequences
-from .wires import Wires
+# Solver modules are imported, and their models and lookup tables built, on
+# first use.
+_SOLVERS = {
+    BombModuleType.BUTTON: ('button', 'Button', ('position', 'frame')),
+    BombModuleType.COMPLICATED_WIRES:
+        ('complicated_wires', 'ComplicatedWires', ('frame',)),
+    BombModuleType.KEYPAD: ('keypad', 'Keypad', ('frame', 'glyphs')),
+    BombModuleType.MAZE: ('maze', 'Maze', ('frame',)),
+    BombModuleType.MEMORY: ('memory', 'Memory', ()),
+    BombModuleType.MORSE_CODE: ('morse_code', 'MorseCode', ()),
+    BombModuleType.PASSWORD: ('password', 'Password', ('frame', 'glyphs')),
+    BombModuleType.SIMON_SAYS: ('simon_says', 'SimonSays', ()),
+    BombModuleType.WHOS_ON_FIRST: ('whos_on_first', 'WhosOnFirst', ()),
+    BombModuleType.WIRE_SEQUENCES: ('wire_sequences', 'WireSequences', ()),
+    BombModuleType.WIRES: ('wires', 'Wires', ('frame',)),
+}
 
 
 def get_solver(
-        module_type: BombModuleType, position: int, bgr_image: NDArray):
-    if module_type == BombModuleType.BUTTON:
-        return Button(position, bgr_image)
-    if module_type == BombModuleType.COMPLICATED_WIRES:
-        return ComplicatedWires(bgr_image)
-    if module_type == BombModuleType.KEYPAD:
-        return Keypad(bgr_image)
-    if module_type == BombModuleType.MAZE:
-        return Maze(bgr_image)
-    if module_type == BombModuleType.MEMORY:
-        return Memory()
-    if module_type == BombModuleType.MORSE_CODE:
-        return MorseCode()
-    if module_type == BombModuleType.PASSWORD:
-        return Password(bgr_image)
-    if module_type == BombModuleType.SIMON_SAYS:
-        return SimonSays()
-    if module_type == BombModuleType.WHOS_ON_FIRST:
-        return WhosOnFirst()
-    if module_type == BombModuleType.WIRE_SEQUENCES:
-        return WireSequences()
-    if module_type == BombModuleType.WIRES:
-        return Wires(bgr_image)
-    return None
+        module_type: BombModuleType, position: int, frame: Frame,
+        glyphs: GlyphService):
+    if module_type not in _SOLVERS:
+        return None
+    module, name, params = _SOLVERS[module_type]
+    args = {'position': position, 'frame': frame, 'glyphs': glyphs}
+    return getattr(_module(module), name)(*(args[x] for x in params))
+
+def prefetch_solvers() -> None:
+    for module, _, _ in _SOLVERS.values():
+        _module(module)
+    CONFIG.load_engines()
+    load_segmenters()
+
+def _module(name: str):
+    return importlib.import_module(f'{__name__}.{name}')
@@ -1,14 +1,15 @@
 import enum
+import logging
 import typing
 from pathlib import Path
+from typing import Optional
 
-import cv2
-import numpy as np
-import torch
-from detectors.timer import detect_timer
+from detectors.timer import TimerReader, locate_timer
+from frame import Frame
+from inference import InferenceEngine
 from models.button import Button as Model
-from numpy.typing import NDArray
-from utils import bgr2hsv, bgr2tensor, crop_image
+from scratch import ScratchArena
+from segmentation import ColorSegmenter
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -25,8 +26,10 @@ class _ButtonText(enum.IntEnum):
     HOLD = enum.auto()
     PRESS = enum.auto()
 
-_MODEL = Model().eval()
-_MODEL.load_state_dict(torch.load(Path('models/Button.pt')))
+_LOGGER = logging.getLogger('timer')
+
+_ENGINE = InferenceEngine(
+    Model, Path('models/Button.pt'), input_size=(262, 243))
 
 _CR_BLUE_STRIP = ((99, 209, 0), (118, 255, 255))
 _CR_RED_STRIP = ((0, 194, 0), (0, 255, 255))
@@ -40,11 +43,18 @@ _STRIP_COLOR = {
     _ButtonColor.WHITE: _CR_WHITE_STRIP,
     _ButtonColor.YELLOW: _CR_YELLOW_STRIP,
 }
+_SEGMENTER = ColorSegmenter(_STRIP_COLOR)
+_SCRATCH = ScratchArena()
 
 _UI_CENTER = (950, 560)
 
+_LOCATE_ATTEMPTS = 5
+_LOCATE_INTERVAL = 0.1
+_LOCATE_TIMEOUT = 10
+
 _BBOX_STRIP = (1072-832, 524-387, 16, 16)
 
+# Fallback regions when the timer cannot be located.
 _BBOX_TIMER = (
     ( # Timer in 1st position.
         None,
@@ -83,11 +93,10 @@ _BBOX_TIMER = (
 )
 
 class Button:
-    def __init__(self, position: int, bgr_image: NDArray) -> None:
-        image = bgr2tensor(bgr_image)
-        color, text = _MODEL(image)
-        self._color = _ButtonColor(color.argmax().item())
-        self._text = _ButtonText(text.argmax().item())
+    def __init__(self, position: int, frame: Frame) -> None:
+        (color,), (text,) = _ENGINE.predict((frame,))
+        self._color = _ButtonColor(color)
+        self._text = _ButtonText(text)
         self._position = position
     
     def solve(self, state: 'GameState') -> None:
@@ -106,14 +115,8 @@ class Button:
         state.mov(*_UI_CENTER).ldn().slp(0.5)
 
         strip_color = None
-        mask = None
         while strip_color is None:
-            image = bgr2hsv(crop_image(state.grab_active_module(), _BBOX_STRIP))
-            for color, color_range in _STRIP_COLOR.items():
-                mask = cv2.inRange(image, *color_range, dst=mask)
-                if np.count_nonzero(mask) >= _THRESH_STRIP_AREA:
-                    strip_color = color
-                    break
+            strip_color = self._detect_strip(state)
                 
         if strip_color == _ButtonColor.BLUE:
             target_digit = 4
@@ -122,13 +125,54 @@ class Button:
         else:
             target_digit = 1
         
-        bbox = _BBOX_TIMER[state.timer_position][self._position]
-        while True:
-            image = bgr2hsv(crop_image(state.grab_screen(), bbox))
-            if target_digit in detect_timer(image):
-                break
+        # The timer stays in place while the button is held.
+        reader = self._locate_timer(state)
+        if reader is None:
+            _LOGGER.error(
+                'timer not found in %d s, releasing the button',
+                _LOCATE_TIMEOUT)
+        else:
+            while target_digit not in self._read_timer(state, reader):
+                pass
 
         state.lup().slp()
+
+    @staticmethod
+    def _detect_strip(state: 'GameState') -> Optional[_ButtonColor]:
+        image = state.grab_module_regions((_BBOX_STRIP,))[0]
+        segmentation = _SEGMENTER.segment(
+            image, dst=_SCRATCH.get('labels', image.shape[:2]))
+        for color in _STRIP_COLOR:
+            if segmentation.count(color) >= _THRESH_STRIP_AREA:
+                return color
+        return None
+
+    def _locate_timer(self, state: 'GameState') -> Optional[TimerReader]:
+        # Layouts missing from the table are located on fresh frames until
+        # the deadline, the digits shown change every second.
+        bboxes = _BBOX_TIMER[state.timer_position]
+        bbox = bboxes and bboxes[self._position]
+        deadline = state.time_ns + int(_LOCATE_TIMEOUT * 1e9)
+        attempts = 0
+        while True:
+            reader = locate_timer(state.grab_screen())
+            if reader is not None:
+                return reader
+            attempts += 1
+            if bbox is not None and attempts >= _LOCATE_ATTEMPTS:
+                _LOGGER.warning('timer not located, reading it at %s', bbox)
+                return TimerReader(bbox)
+            if state.time_ns >= deadline:
+                return None
+            state.slp(_LOCATE_INTERVAL)
+
+    @staticmethod
+    def _read_timer(state: 'GameState', reader: TimerReader) -> list[int]:
+        # The contour reader fails on some frames, the next one is read.
+        try:
+            return reader.read(state.grab_regions((reader.bbox,))[0])
+        except IndexError:
+            return []
     
     def _should_hold(
             self, battery_count: int,
@@ -1,8 +1,7 @@
 import typing
 
 from detectors.complicated_wires import detect_complicated_wires
-from numpy.typing import NDArray
-from utils import bgr2hsv
+from frame import Frame
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -33,8 +32,8 @@ _DIAGRAM = {
 }
 
 class ComplicatedWires:
-    def __init__(self, bgr_image: NDArray) -> None:
-        self._wires = detect_complicated_wires(bgr2hsv(bgr_image))
+    def __init__(self, frame: Frame) -> None:
+        self._wires = detect_complicated_wires(frame)
     
     def solve(self, state: 'GameState') -> None:
         for ndx, (led, star, color) in enumerate(self._wires):
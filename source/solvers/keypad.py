@@ -2,17 +2,17 @@ import enum
 import typing
 from pathlib import Path
 
-import torch
 from detectors.keypad import detect_keypad
+from frame import Frame
+from glyphs import GlyphService
+from inference import InferenceEngine
 from models.symbols import Symbols as Model
-from numpy.typing import NDArray
-from utils import bgr2hsv, fit_image_size, gray2tensor, tensors2batch
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
 
-_MODEL = Model(27).eval()
-_MODEL.load_state_dict(torch.load(Path('models/KeypadSymbols.pt')))
+_ENGINE = InferenceEngine(
+    lambda: Model(27), Path('models/KeypadSymbols.pt'), (64, 64))
 
 _UI_BUTTONS = ((905, 510), (1005, 510), (905, 600), (1005, 600))
 
@@ -103,14 +103,13 @@ _COLUMNS = (
 )
 
 class Keypad:
-    def __init__(self, bgr_image: NDArray) -> None:
-        images = detect_keypad(bgr_image, bgr2hsv(bgr_image))
-        batch = [gray2tensor(fit_image_size(x, 64, 64)) for x in images]
-        batch = tensors2batch(batch)
-        prediction = _MODEL(batch).argmax(dim=1).tolist()
-        self._symbols = [_KeypadSymbol(x) for x in prediction]
+    def __init__(self, frame: Frame, glyphs: GlyphService) -> None:
+        self._request = glyphs.submit(
+            _ENGINE, detect_keypad(frame),
+            lambda prediction: [_KeypadSymbol(x) for x in prediction])
     
     def solve(self, state: 'GameState') -> None:
+        self._symbols = self._request.get()
         column = next(filter(lambda x, y=set(self._symbols): y.issubset(x), _COLUMNS))
         indices = [column.index(x) for x in self._symbols]
         for i in sorted(range(4), key=lambda i: indices[i]):
@@ -2,10 +2,9 @@ import typing
 from base64 import b85decode
 from collections import deque
 
-import cv2
 import numpy as np
 from detectors.maze import detect_maze
-from numpy.typing import NDArray
+from frame import Frame
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -39,9 +38,8 @@ _UI_BUTTONS = {
     'U': (970, 425), 'D': (970, 650)}
 
 class Maze:
-    def __init__(self, bgr_image: NDArray) -> None:
-        hsv_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2HSV)
-        self._start, self._finish, self._marker = detect_maze(hsv_image)
+    def __init__(self, frame: Frame) -> None:
+        self._start, self._finish, self._marker = detect_maze(frame.hsv)
     
     def solve(self, state: 'GameState') -> None:
         path = self._find_path()
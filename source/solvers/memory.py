@@ -1,16 +1,16 @@
 import typing
 from pathlib import Path
 
-import torch
 from detectors.memory import detect_memory
+from inference import InferenceEngine
 from models.symbols import Symbols
-from utils import bgr2hsv, fit_image_size, gray2tensor, tensors2batch
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
 
-_MODEL = Symbols(4).eval()
-_MODEL.load_state_dict(torch.load(Path('models/MemorySymbols.pt')))
+_ENGINE = InferenceEngine(
+    lambda: Symbols(4), Path('models/MemorySymbols.pt'), (64, 64),
+    prototypes=True)
 
 _UI_BUTTONS = ((885, 600), (925, 600), (970, 600), (1015, 600))
 
@@ -25,15 +25,13 @@ class Memory:
     def solve(self, state: 'GameState') -> None:
         for stage in range(5):
             while True:
-                bgr_image = state.grab_active_module()
-                hsv_image = bgr2hsv(bgr_image)
-                if hsv_image[:, :, 2].mean() > 100:
+                frame = state.grab_active_module()
+                if frame.value.mean() > 100:
                     break
 
-            digits = detect_memory(bgr_image, hsv_image)
+            digits = detect_memory(frame)
 
-            batch = [gray2tensor(fit_image_size(x, 64, 64)) for x in digits]
-            display, *buttons = (_MODEL(tensors2batch(batch)).argmax(dim=1)+1).tolist()
+            display, *buttons = [x+1 for x in _ENGINE.predict(digits)]
             
             if stage == 0:
                 pressed = display-1 if display > 2 else 1
@@ -1,8 +1,8 @@
-import time
 import typing
 
 import cv2
-from utils import bgr2hsv, crop_image
+from scratch import ScratchArena
+from utils import bgr2hsv
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -11,6 +11,7 @@ _CR_BLINKER = ((0, 177, 198), (34, 255, 255))
 _BBOX_BLINKER = (94, 35, 16, 16)
 _UI_RIGHT_ARROW = (1065, 560)
 _UI_TX_BUTTON = (980, 625)
+_SCRATCH = ScratchArena()
 
 _WORDS = (
     '... .... . .-.. .-..', # shell
@@ -37,16 +38,19 @@ class MorseCode:
         pass
     
     def solve(self, state: 'GameState') -> None:
-        self._wait_for_blinker(True, state)
-        last_off = self._wait_for_blinker(False, state)
-        last_on = self._wait_for_blinker(True, state)
+        with state.stream_module_regions((_BBOX_BLINKER,)):
+            self._read_code(state)
+
+    def _read_code(self, state: 'GameState') -> None:
+        last_off = self._wait_for_blinker(True, state)
+        last_on = self._wait_for_blinker(False, state)
 
         was_on = True
         code = ''
 
         while True:
-            curr_tm = time.monotonic_ns()
             is_on = self._is_blinker_on(state)
+            curr_tm = state.frame_time
             if was_on and not is_on:
                 delta = (curr_tm - last_on) * 1e-9
                 code += '-' if delta > 0.7 else '.'
@@ -80,14 +84,15 @@ class MorseCode:
     
     @staticmethod
     def _is_blinker_on(state: 'GameState') -> bool:
-        hsv_image = bgr2hsv(state.grab_active_module())
-        hsv_image = crop_image(hsv_image, _BBOX_BLINKER)
-        mask = cv2.inRange(hsv_image, *_CR_BLINKER)
+        image = state.grab_module_regions((_BBOX_BLINKER,))[0]
+        hsv_image = bgr2hsv(image, dst=_SCRATCH.get('hsv', image.shape))
+        mask = cv2.inRange(
+            hsv_image, *_CR_BLINKER,
+            dst=_SCRATCH.get('mask', image.shape[:2]))
         return cv2.countNonZero(mask) > 200
     
     @staticmethod
     def _wait_for_blinker(wait_for_on: bool, state: 'GameState') -> int:
-        tm = time.monotonic_ns()
         while MorseCode._is_blinker_on(state) == wait_for_on:
             pass
-        return tm
+        return state.frame_time
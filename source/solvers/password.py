@@ -1,18 +1,18 @@
 import typing
+from pathlib import Path
 
-import cv2
 import numpy as np
-import torch
 from detectors.password import detect_password
+from frame import Frame
+from glyphs import GlyphService
+from inference import InferenceEngine
 from models.symbols import Symbols
-from numpy.typing import NDArray
-from utils import bgr2hsv, gray2tensor, tensors2batch, fit_image_size
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
 
-_MODEL = Symbols(26).eval()
-_MODEL.load_state_dict(torch.load('models/PasswordSymbols.pt'))
+_ENGINE = InferenceEngine(
+    lambda: Symbols(26), Path('models/PasswordSymbols.pt'), (64, 64))
 
 _UI_UP_ARROWS = ((890, 460), (932, 460), (972, 460), (1014, 460), (1055, 460))
 _UI_DN_ARROWS = ((890, 605), (932, 605), (972, 605), (1014, 605), (1055, 605))
@@ -29,28 +29,26 @@ _TABLE = (
 )
 
 class Password:
-    def __init__(self, bgr_image: NDArray) -> None:
-        hsv_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2HSV)
-        letters = detect_password(bgr_image, hsv_image)
-        self._state = self._detect_text(letters)
+    def __init__(self, frame: Frame, glyphs: GlyphService) -> None:
+        self._request = glyphs.submit(
+            _ENGINE, detect_password(frame), self._decode)
     
     def _detect_text(self, images):
-        batch = [gray2tensor(fit_image_size(image, 64, 64))
-                 for image in images]
-        with torch.no_grad():
-            prediction = _MODEL(tensors2batch(batch)).argmax(dim=1).tolist()
-            return ['abcdefghijklmnopqrstuvwxyz'[x] for x in prediction]
+        return self._decode(_ENGINE.predict(images))
+
+    @staticmethod
+    def _decode(prediction):
+        return ['abcdefghijklmnopqrstuvwxyz'[x] for x in prediction]
 
     def solve(self, state: 'GameState') -> None:
+        self._state = self._request.get()
         for _ in range(5):
             state.mov(*_UI_DN_ARROWS[0])
             for pos in _UI_DN_ARROWS[1:]:
                 state.ldn().lup().slp().mov(*pos)
             state.ldn().lup().slp()
 
-            bgr_image = state.grab_active_module()
-            hsv_image = bgr2hsv(bgr_image)
-            letters = detect_password(bgr_image, hsv_image)
+            letters = detect_password(state.grab_active_module())
             letters = self._detect_text(letters)
             self._state = [y+x for x, y in zip(self._state, letters)]
 
@@ -1,7 +1,9 @@
 import typing
 
-import cv2
-from detectors.simon_says import SimonSaysColor, detect_simon_says
+from detectors.simon_says import (PATCH_BBOXES, SimonSaysColor,
+                                  detect_simon_says)
+from scratch import ScratchArena
+from utils import bgr2hsv
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -51,6 +53,8 @@ _MAPPING = {
     (False, 2, SimonSaysColor.YELLOW): SimonSaysColor.RED,
 }
 
+_SCRATCH = ScratchArena()
+
 class SimonSays:
     def __init__(self):
         pass
@@ -63,9 +67,7 @@ class SimonSays:
 
         is_solved = False
         while not is_solved:
-            image = state.grab_active_module()
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            color, is_solved = detect_simon_says(image)
+            color, is_solved = self._detect(state)
 
             if is_solved:
                 break
@@ -74,9 +76,7 @@ class SimonSays:
 
             if cur_step != len(self._sequence):
                 while color != SimonSaysColor.NONE and not is_solved:
-                    image = state.grab_active_module()
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-                    color, is_solved = detect_simon_says(image)
+                    color, is_solved = self._detect(state)
                 cur_step += 1
                 continue
 
@@ -84,6 +84,13 @@ class SimonSays:
             self._sequence.append(color)
             self._solve_step(state)
     
+    @staticmethod
+    def _detect(state: 'GameState') -> tuple[SimonSaysColor, bool]:
+        patches = state.grab_module_regions(PATCH_BBOXES)
+        return detect_simon_says([
+            bgr2hsv(x, dst=_SCRATCH.get(i, x.shape))
+            for i, x in enumerate(patches)])
+
     def _solve_step(self, state: 'GameState') -> None:
         for color in self._sequence:
             other_color = _MAPPING[(
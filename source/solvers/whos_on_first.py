@@ -1,10 +1,9 @@
 import typing
 from pathlib import Path
 
-import torch
 from detectors.whos_on_first import detect_whos_on_first
+from inference import InferenceEngine
 from models.whos_on_first import WhosOnFirst as Model
-from utils import bgr2hsv, gray2tensor, tensors2batch, fit_image_size
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
@@ -12,8 +11,7 @@ if typing.TYPE_CHECKING:
 _UI_BUTTONS = (
     (910, 515), (995, 515), (910, 565), (995, 565), (910, 610), (995, 610))
 
-_MODEL = Model().eval()
-_MODEL.load_state_dict(torch.load(Path('models/WhosOnFirstText.pt')))
+_ENGINE = InferenceEngine(Model, Path('models/WhosOnFirstText.pt'), (128, 64))
 _LABELS = (
     'blank', 'c', 'cee', 'display', 'done', 'first', 'hold', 'hold on',
     'lead', 'led', 'leed', 'left', 'like', 'middle', 'next', 'no',
@@ -67,15 +65,11 @@ class WhosOnFirst:
 
     def _solve_step(self, state: 'GameState') -> None:
         while True:
-            bgr_image = state.grab_active_module()
-            hsv_image = bgr2hsv(bgr_image)
-            if hsv_image[:, :, 2].mean() > 100:
+            frame = state.grab_active_module()
+            if frame.value.mean() > 100:
                 break
 
-        batch = [gray2tensor(fit_image_size(image, 128, 64))
-                 for image in detect_whos_on_first(bgr_image, hsv_image)]
-        with torch.no_grad():
-            prediction = _MODEL(tensors2batch(batch)).argmax(dim=1).tolist()
+        prediction = _ENGINE.predict(detect_whos_on_first(frame))
         display, *labels = [_LABELS[x] for x in prediction]
 
         row = _LABEL_TABLE[labels[_DISPLAY_TABLE[display]]]
@@ -1,19 +1,15 @@
 import typing
 from pathlib import Path
 
-import cv2
-import numpy as np
-import torch
+from inference import InferenceEngine
 from models.wire_sequences import WireSequences as Model
-from numpy.typing import NDArray
-from utils import bgr2hsv, bgr2tensor, crop_image
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
 
 
-_MODEL = Model().eval()
-_MODEL.load_state_dict(torch.load(Path('models/WireSequences.pt')))
+_ENGINE = InferenceEngine(
+    Model, Path('models/WireSequences.pt'), input_size=(297, 293))
 
 _UI_WIRES = ((910, 490), (910, 530), (910, 575))
 _UI_NEXT_PANEL = (950, 635)
@@ -31,13 +27,11 @@ class WireSequences:
         counts = {'R': 0, 'B': 0, 'K': 0}
         for panel_id in range(4):
             while True:
-                bgr_image = state.grab_active_module()
-                hsv_image = bgr2hsv(bgr_image)
-                if hsv_image[:, :, 2].mean() > 100:
+                frame = state.grab_active_module()
+                if frame.value.mean() > 100:
                     break
             
-            tensor = bgr2tensor(state.grab_active_module())
-            result = torch.stack(_MODEL(tensor)).argmax(dim=-1).squeeze().tolist()
+            result = [x[0] for x in _ENGINE.predict((frame,))]
             direction, color = result[:3], result[3:]
             direction = ['XABC'[x] for x in direction]
             color = ['XKBR'[x] for x in color]
@@ -2,26 +2,24 @@ import typing
 
 import cv2
 from detectors.wires import _WireColor, detect_wires
-from numpy.typing import NDArray
-from utils import bgr2hsv
+from frame import Frame
 
 if typing.TYPE_CHECKING:
     from game_state import GameState
 
 class Wires:
-    def __init__(self, bgr_image: NDArray) -> None:
-        hsv_image = bgr2hsv(bgr_image)
-        self._wires = detect_wires(hsv_image, False)
+    def __init__(self, frame: Frame) -> None:
+        self._wires = detect_wires(frame, False)
     
     def solve(self, state: 'GameState') -> None:
         ndx = self._find_solution(int(state.serial[-1])%2 == 1)
 
         while True:
-            hsv_image = bgr2hsv(state.grab_active_module())
-            if hsv_image[:, :, 2].mean() > 100:
+            frame = state.grab_active_module()
+            if frame.value.mean() > 100:
                 break
 
-        positions = detect_wires(hsv_image, True)
+        positions = detect_wires(frame, True)
         x = positions[ndx][0] + 832
         y = positions[ndx][1] + 387
         state.mov(x, y).ldn().lup().slp()
@@ -1,38 +1,28 @@
 from typing import Optional, Sequence
 
 import cv2
-import torch
 import numpy as np
+from frame import Frame
 from numpy.typing import NDArray
 
 
-def crop_image(image: NDArray, bbox: Sequence[int]) -> NDArray:
+def crop_image(image: NDArray | Frame, bbox: Sequence[int]) -> NDArray | Frame:
+    if isinstance(image, Frame):
+        return image.region(bbox)
     return image[
         bbox[1] : bbox[1] + bbox[3],
         bbox[0] : bbox[0] + bbox[2]]
 
-def bgr2hsv(image: NDArray, dst: Optional[NDArray] = None) -> NDArray:
+def bgr2hsv(image: NDArray | Frame, dst: Optional[NDArray] = None) -> NDArray:
+    if isinstance(image, Frame):
+        return image.hsv
     return cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=dst)
 
-def bgr2gray(image: NDArray, dst: Optional[NDArray] = None) -> NDArray:
+def bgr2gray(image: NDArray | Frame, dst: Optional[NDArray] = None) -> NDArray:
+    if isinstance(image, Frame):
+        return image.gray
     return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
 
-def bgr2tensor(image: NDArray) -> torch.Tensor:
-    tensor = torch.from_numpy(image) * (1/255)
-    tensor = tensor.unsqueeze(0) \
-        .permute(0, 3, 1, 2) \
-        .to(memory_format=torch.channels_last)
-    return tensor
-
-def gray2tensor(image: NDArray) -> torch.Tensor:
-    tensor = torch.from_numpy(image) * (1/255)
-    return tensor.unsqueeze_(-1)
-
-def tensors2batch(tensors: Sequence[torch.Tensor]) -> torch.Tensor:
-    batch = torch.stack(tensors)
-    batch = batch.permute(0, 3, 1, 2).to(memory_format=torch.channels_last)
-    return batch
-
 def get_centroid(contour: NDArray, round: bool = False) \
         -> tuple[float, float] | tuple[int, int]:
     m = cv2.moments(contour)
@@ -65,11 +55,114 @@ def filter_contours_by_area(
         contours: Sequence[NDArray], threshold: float) -> list[NDArray]:
     return [c for c in contours if cv2.contourArea(c) >= threshold]
 
-def fit_image_size(
-        image: NDArray, max_width: int, max_height: int) -> NDArray:
-    result = image
-
-    input_height, input_width = result.shape[:2]
+class Blobs:
+    # External contours of a mask with their stats as arrays. Indexing with
+    # anything NumPy accepts (a boolean filter, an argsort result) selects a
+    # subset, so blobs can be filtered and sorted without loops. Stats are
+    # computed on first use, for the blobs selected at that point only.
+    def __init__(
+            self, contours: NDArray,
+            stats: Optional[dict[str, NDArray]] = None) -> None:
+        self._contours = contours
+        self._stats = {} if stats is None else stats
+
+    def __len__(self) -> int:
+        return len(self._contours)
+
+    def __getitem__(self, index) -> 'Blobs':
+        return Blobs(
+            self._contours[index],
+            {k: v[index] for k, v in self._stats.items()})
+
+    @property
+    def contours(self) -> NDArray:
+        return self._contours
+
+    @property
+    def area(self) -> NDArray:
+        # Contour areas, as cv2.contourArea.
+        areas = self._stats.get('area')
+        if areas is None:
+            areas = self._stats['area'] = np.array(
+                [cv2.contourArea(x) for x in self._contours], dtype=float)
+        return areas
+
+    @property
+    def bboxes(self) -> NDArray:
+        bboxes = self._stats.get('bboxes')
+        if bboxes is None:
+            bboxes = self._stats['bboxes'] = np.array(
+                [cv2.boundingRect(x) for x in self._contours],
+                dtype=int).reshape(-1, 4)
+        return bboxes
+
+    @property
+    def x(self) -> NDArray:
+        return self.bboxes[:, 0]
+
+    @property
+    def y(self) -> NDArray:
+        return self.bboxes[:, 1]
+
+    @property
+    def width(self) -> NDArray:
+        return self.bboxes[:, 2]
+
+    @property
+    def height(self) -> NDArray:
+        return self.bboxes[:, 3]
+
+    @property
+    def right(self) -> NDArray:
+        return self.x + self.width - 1
+
+    @property
+    def bottom(self) -> NDArray:
+        return self.y + self.height - 1
+
+    @property
+    def centroids(self) -> NDArray:
+        # Degenerate contours without area get the center of their
+        # bounding box.
+        centroids = self._stats.get('centroids')
+        if centroids is None:
+            centroids = self._stats['centroids'] = np.array(
+                [_centroid(x) for x in self._contours],
+                dtype=float).reshape(-1, 2)
+        return centroids
+
+    def bbox(self, i: int) -> tuple[int, int, int, int]:
+        bboxes = self._stats.get('bboxes')
+        if bboxes is None:
+            return cv2.boundingRect(self._contours[i])
+        return tuple(bboxes[i].tolist())
+
+    def filled_image(self, i: int) -> NDArray:
+        # 0/255 mask of the filled contour, cropped to its bounding box.
+        x, y, w, h = self.bbox(i)
+        return draw_contour_mask(
+            np.zeros((h, w), np.uint8), self._contours[i], offset=(-x, -y))
+
+def _centroid(contour: NDArray) -> tuple[float, float]:
+    m = cv2.moments(contour)
+    if m['m00'] == 0:
+        x, y, w, h = cv2.boundingRect(contour)
+        return x + (w - 1) / 2, y + (h - 1) / 2
+    inv_area = 1 / m['m00']
+    return m['m10'] * inv_area, m['m01'] * inv_area
+
+def find_blobs(mask: NDArray) -> Blobs:
+    contours = find_contours(mask)
+    array = np.empty(len(contours), dtype=object)
+    for i, contour in enumerate(contours):
+        array[i] = contour
+    return Blobs(array)
+
+def letterbox_image(image: NDArray, dst: NDArray) -> None:
+    # Scales the image down to fit dst and centers it there. The rest of dst
+    # is left as is, so dst is expected to be zeroed.
+    max_height, max_width = dst.shape[:2]
+    input_height, input_width = image.shape[:2]
     if input_height > max_height or input_width > max_width:
         aspect = input_width / input_height
 
@@ -80,17 +173,10 @@ def fit_image_size(
             new_width = int(max_height * aspect)
         else:
             new_height = int(max_width / aspect)
-        
-        result = cv2.resize(
-            result, (new_width, new_height), cv2.INTER_NEAREST)
-        input_height, input_width = result.shape[:2]
-    
-    if input_height != max_height or input_width != max_width:
-        pad_width = (
-            ((max_height - input_height) // 2,
-            (max_height - input_height + 1) // 2),
-            ((max_width - input_width) // 2,
-            (max_width - input_width + 1) // 2))
-        result = np.pad(result, pad_width)
-
-    return result
+
+        image = cv2.resize(image, (new_width, new_height))
+        input_height, input_width = image.shape[:2]
+
+    top = (max_height - input_height) // 2
+    left = (max_width - input_width) // 2
+    dst[top : top + input_height, left : left + input_width] = image